@@ -0,0 +1,84 @@
+"""Admission control for the expensive pipeline stages.
+
+Each stage (parse, geocode, map) has a fixed number of slots shared by every
+session in the process. Sessions queue for a slot in arrival order, so under
+load work is admitted fairly and at a steady rate instead of every upload
+running at once. The gate keeps a moving average of how long a stage takes
+so a queued session can be shown its position and an estimated wait.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+
+class StageGate:
+    """Bounded slots for one stage, granted first come, first served"""
+
+    def __init__(self, name, slots, initial_estimate=1.0, smoothing=0.2):
+        self.name = name
+        self.slots = max(1, slots)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._active = 0
+        self._smoothing = smoothing
+        # Moving average of seconds a stage holds its slot
+        self.average_seconds = initial_estimate
+
+    def enqueue(self):
+        """Join the queue and return a ticket for wait/cancel"""
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+        return ticket
+
+    def wait(self, ticket, timeout=None):
+        """Block until the ticket is admitted (True) or timeout passes (False)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._queue and self._queue[0] is ticket and self._active < self.slots:
+                    self._queue.popleft()
+                    self._active += 1
+                    # The next ticket may be admissible too
+                    self._cond.notify_all()
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def cancel(self, ticket):
+        """Leave the queue without having been admitted"""
+        with self._cond:
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                return
+            self._cond.notify_all()
+
+    def release(self, duration):
+        """Free an admitted slot, recording how long it was held"""
+        with self._cond:
+            self._active -= 1
+            self.average_seconds += self._smoothing * (duration - self.average_seconds)
+            self._cond.notify_all()
+
+    def position(self, ticket):
+        """1-based place in the queue, or 0 once admitted"""
+        with self._cond:
+            try:
+                return self._queue.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def estimated_wait(self, position):
+        """Seconds until a ticket at position is likely admitted"""
+        if position <= 0:
+            return 0.0
+        return math.ceil(position / self.slots) * self.average_seconds
+
+    def load(self):
+        """(active, queued) snapshot, for diagnostics"""
+        with self._cond:
+            return self._active, len(self._queue)
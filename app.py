@@ -1,151 +1,166 @@
+# Heavy modules (pandas, folium, requests, numpy, constants) are imported
+# inside the functions that need them, so the upload screen renders without
+# loading them. Keep it that way: bench_import_time.py enforces the budget.
+from __future__ import annotations
+
+import contextlib
 import os
 import re
-import pandas as pd
-from io import StringIO
-import requests
 import time
-import folium
+import uuid
 import streamlit as st
-import streamlit.components.v1 as components
-import json
-from folium.plugins import MarkerCluster
-from constants import FIFA_TO_COUNTRY, PROVINCE_LOOKUP
 
 LOCATIONIQ_SEARCH_URL = "https://eu1.locationiq.com/v1/search"
+# Seconds between LocationIQ requests, shared by every session
+GEOCODE_INTERVAL = 1.1
+
+# Initial zoom of the world map
+MAP_ZOOM_START = 2
+
+# Density mode: size of a heatmap bin in degrees of lat/lon
+HEATMAP_BIN_DEGREES = 0.5
+# Above this many geocoded players the map defaults to density mode
+DENSITY_MODE_THRESHOLD = 3000
+
+# Export column names (lowercased match) -> names used by the app
+COLUMN_ALIASES = {
+    "Nom": "PlayerName",
+    "Name": "PlayerName",
+    "Player Name": "PlayerName",
+    "Ville de naissance": "BirthCity",
+    "Birth City": "BirthCity",
+    "Birthplace": "BirthCity",
+    "Nation of Birth": "NoB",
+    "NoB": "NoB",
+    "Nationality": "Nat",
+    "2nd Nat": "2nd Nat",
+    "UID": "UID"
+}
+
+# CSV uploads above this size are parsed in chunks of CSV_CHUNK_ROWS rows
+CSV_CHUNK_THRESHOLD_BYTES = 20 * 1024 * 1024
+CSV_CHUNK_ROWS = 50_000
+
+# Per-session upload limits
+MAX_UPLOAD_MB = int(os.environ.get("FM_MAX_UPLOAD_MB", "50"))
+MAX_PLAYERS = int(os.environ.get("FM_MAX_PLAYERS", "50000"))
+
+# Serve map tiles through the local caching proxy (see tile_proxy.py)
+TILE_PROXY_ENABLED = os.environ.get("FM_TILE_PROXY") == "1"
 
 # Setup page config
 st.set_page_config(
     page_title="FM Birthplace Map Generator",
-    page_icon="",
+    # None, not "": an empty icon goes through streamlit's image handling,
+    # which imports numpy and PIL on the upload screen
+    page_icon=None,
     layout="wide",
     initial_sidebar_state="collapsed"
 )
 
-# CSS styling
-st.markdown(
-    """
-    <style>
-    /* ===== Page Header ===== */
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-    }
+@st.cache_resource
+def load_css():
+    """Read the app stylesheet once per process"""
+    with open(os.path.join(os.path.dirname(__file__), "style.css"), "r") as f:
+        return f"<style>{f.read()}</style>"
 
-    /* ===== Upload Section ===== */
-    .upload-section {
-        background: #f8fafc;
-        padding: 2rem;
-        border-radius: 10px;
-        border: 2px dashed #cbd5e0;
-        text-align: center;
-        margin: 2rem 0;
-    }
-    .upload-section h3 {
-        margin-bottom: 0.5rem;
-    }
-    .upload-section p {
-        margin-top: 0;
-        color: #374151;
-    }
-
-    /* ===== Stats Cards ===== */
-    .stats-card {
-        background: white;
-        padding: 1rem;
-        border-radius: 8px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    .stats-card h3 {
-        margin: 0;
-        font-size: 2rem;
-        color: #2563EB;
-    }
-    .stats-card p {
-        margin: 0;
-        color: #374151;
-    }
-
-    /* ===== Progress Bar Color ===== */
-    .stProgress > div > div > div > div {
-        background-color: #667eea !important;
-    }
-
-    /* ===== Clear Data Button ===== */
-    .clear-container {
-        text-align: center;
-        margin-top: 1rem;
-        margin-bottom: 2rem;
-    }
-    .clear-container .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        padding: 0.75rem 1.5rem;
-        border-radius: 10px;
-        font-weight: 600;
-        font-size: 14px;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-        transition: all 0.3s ease;
-        min-width: 200px;
-    }
-    .clear-container .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 12px rgba(0,0,0,0.3);
-    }
-    
-    /* ===== Info Icon Tooltip ===== */
-    .info-icon {
-        display: inline-block;
-        color: #667eea;
-        margin-left: 8px;
-        cursor: pointer;
-        font-size: 20px;
-        vertical-align: middle;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+# CSS styling
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Init session state
 if "geocode_cache" not in st.session_state:
     st.session_state.geocode_cache = {}
 if "players_data" not in st.session_state:
     st.session_state.players_data = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "geocode_job" not in st.session_state:
+    st.session_state.geocode_job = None
+
+# Opt-in profiling, checked every run so ?profile=1 can be added to a live session
+PROFILING = os.environ.get("FM_PROFILE") == "1" or st.query_params.get("profile") == "1"
+if PROFILING and "run_profile" not in st.session_state:
+    from profiling import RunProfile
+
+    st.session_state.run_profile = RunProfile()
+
+def profiled(stage):
+    """Profile the enclosed pipeline stage when profiling is on, otherwise do nothing"""
+    if not PROFILING:
+        return contextlib.nullcontext()
+    return st.session_state.run_profile.stage(stage)
+
+@st.cache_resource
+def get_stage_gates():
+    """Process-wide slots for the expensive stages, shared by every session"""
+    from admission import StageGate
+
+    cpus = os.cpu_count() or 2
+    return {
+        "parse": StageGate("parse", int(os.environ.get("FM_PARSE_SLOTS", max(1, cpus // 2)))),
+        "geocode": StageGate("geocode", int(os.environ.get("FM_GEOCODE_SLOTS", max(1, cpus // 2)))),
+        "map": StageGate("map", int(os.environ.get("FM_MAP_SLOTS", cpus))),
+    }
 
-def load_cache():
-    """Load geocoding cache from disk if available"""
-    cache_file = "geocode_cache.json"
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_cache(cache):
-    """Save geocoding cache to disk"""
-    cache_file = "geocode_cache.json"
+@contextlib.contextmanager
+def admitted(stage):
+    """Wait for a free slot for stage, showing queue position and estimated wait"""
+    gate = get_stage_gates()[stage]
+    status = st.empty()
+    ticket = gate.enqueue()
+    start = None
     try:
-        with open(cache_file, "w") as f:
-            json.dump(cache, f)
-    except:
-        pass
+        while not gate.wait(ticket, timeout=0.5):
+            position = gate.position(ticket)
+            status.info(
+                f"⏳ Server busy: you are #{position} in the queue, "
+                f"estimated wait ~{gate.estimated_wait(position):.0f}s"
+            )
+        start = time.monotonic()
+        # Any streamlit call can raise on rerun/disconnect, so this one
+        # already runs with the slot held and released below
+        status.empty()
+        yield
+    finally:
+        if start is None:
+            # Rerun or disconnect while queued: give the place up
+            gate.cancel(ticket)
+        else:
+            gate.release(time.monotonic() - start)
+
+def check_upload_size(uploaded_files):
+    """Enforce the per-session upload size limit"""
+    total = sum(getattr(f, "size", 0) or 0 for f in uploaded_files)
+    if total > MAX_UPLOAD_MB * 1024 * 1024:
+        st.error(f"Upload too large ({total / 1024 / 1024:.0f} MB). The limit is {MAX_UPLOAD_MB} MB.")
+        return False
+    return True
+
+def check_player_count(count):
+    """Enforce the per-session player limit"""
+    if count > MAX_PLAYERS:
+        st.error(f"Too many players ({count:,}). The limit is {MAX_PLAYERS:,} per upload.")
+        return False
+    return True
+
+@st.cache_resource
+def get_snapshot():
+    """Memory-map the prebuilt geocode snapshot once per process"""
+    from geocode_snapshot import load_snapshot
+
+    return load_snapshot()
 
 def _alpha3_to_country_name(alpha3: str) -> str:
     """Convert FIFA code to country name"""
+    from constants import FIFA_TO_COUNTRY
+
     key = alpha3.strip().upper()
     return FIFA_TO_COUNTRY.get(key, alpha3)
 
 def build_query_key(row):
     """Create geocoding query from city and country info"""
+    from constants import FIFA_TO_COUNTRY, PROVINCE_LOOKUP
+
     base = row["BirthCity_base"]
     paren = row.get("BirthCity_paren", None)
     nob = row.get("NoB", None)
@@ -171,24 +186,56 @@ def build_query_key(row):
 
     return ", ".join(parts)
 
-def geocode_city(full_query: str, cache: dict = None) -> dict:
-    if cache is not None and full_query in cache:
-        return cache[full_query]
+def build_query_ladder(row):
+    """Candidate geocoding keys for a row: full key, then city+country, then city+province"""
+    from constants import FIFA_TO_COUNTRY, PROVINCE_LOOKUP
+
+    base = row["BirthCity_base"]
+    paren = row.get("BirthCity_paren", None)
+    nob = row.get("NoB", None)
+
+    country = province = None
+    if isinstance(paren, str) and paren.strip():
+        uc = paren.strip().upper()
+        if len(uc) == 3 and uc in FIFA_TO_COUNTRY:
+            country = _alpha3_to_country_name(uc)
+        elif len(uc) == 2 and uc in PROVINCE_LOOKUP:
+            province = PROVINCE_LOOKUP[uc]
+        else:
+            province = paren.strip()
+
+    if country is None and isinstance(nob, str) and nob.strip():
+        if len(nob.strip()) == 3 and nob.strip().upper() in FIFA_TO_COUNTRY:
+            country = _alpha3_to_country_name(nob.strip().upper())
+        else:
+            country = nob.strip()
+
+    ladder = [build_query_key(row)]
+    if country:
+        ladder.append(f"{base}, {country}")
+    if province:
+        ladder.append(f"{base}, {province}")
+    return tuple(dict.fromkeys(ladder))
+
+def geocode_city(full_query: str, api_key: str) -> tuple:
+    """Look up one query on LocationIQ, returning (result, error message).
+
+    The message is only set when the lookup itself failed (rate limit, auth,
+    network); a query with no match returns (None, None). Runs on the
+    background geocoding worker, so it must not call streamlit.
+    """
+    import requests
 
     # reject garbage queries early
     if not isinstance(full_query, str):
-        if cache is not None:
-            cache[full_query] = None
-        return None
+        return None, None
     q = full_query.strip()
     if not q or q == "-" or q.startswith("-,"):
-        if cache is not None:
-            cache[full_query] = None
-        return None
+        return None, None
 
     try:
         params = {
-            "key": st.secrets["LOCATIONIQ_KEY"],
+            "key": api_key,
             "q": q,
             "format": "json",
             "limit": 1,
@@ -198,30 +245,22 @@ def geocode_city(full_query: str, cache: dict = None) -> dict:
         resp = requests.get(LOCATIONIQ_SEARCH_URL, params=params, timeout=10)
 
         if resp.status_code == 429:
-            st.error("LocationIQ rate-limited (HTTP 429).")
-            if cache is not None:
-                cache[full_query] = None
-            return None
+            return None, "LocationIQ rate-limited (HTTP 429)."
 
         if resp.status_code in (401, 403):
-            st.error(f"LocationIQ auth denied (HTTP {resp.status_code}).")
-            if cache is not None:
-                cache[full_query] = None
-            return None
+            return None, f"LocationIQ auth denied (HTTP {resp.status_code})."
+
+        if resp.status_code == 404:
+            # LocationIQ's answer for "Unable to geocode": a real no-result
+            return None, None
 
         if resp.status_code != 200:
-            st.warning(f"LocationIQ HTTP {resp.status_code} for '{q}'")
-            if cache is not None:
-                cache[full_query] = None
-            return None
+            return None, f"LocationIQ HTTP {resp.status_code} for '{q}'"
 
         data = resp.json()
 
         if isinstance(data, dict) and data.get("error"):
-            st.warning(f"LocationIQ error for '{q}': {data.get('error')}")
-            if cache is not None:
-                cache[full_query] = None
-            return None
+            return None, f"LocationIQ error for '{q}': {data.get('error')}"
 
         if isinstance(data, list) and data:
             address = data[0].get("address", {}) or {}
@@ -230,16 +269,62 @@ def geocode_city(full_query: str, cache: dict = None) -> dict:
                 "lon": float(data[0]["lon"]),
                 "country": address.get("country", "Unknown"),
             }
-            if cache is not None:
-                cache[full_query] = result
-            return result
+            return result, None
 
     except Exception as e:
-        st.warning(f"Geocoding exception for '{q}': {e}")
+        return None, f"Geocoding exception for '{q}': {e}"
 
-    if cache is not None:
-        cache[full_query] = None
-    return None
+    return None, None
+
+def resolve_ladder(ladder: tuple, api_key: str, cache) -> tuple:
+    """Geocode the candidates of a ladder in order until one resolves.
+
+    Every candidate with a definite answer is cached, so later plans can skip
+    it. A failed lookup (rate limit, auth, network) says nothing about the
+    query, so it stops the ladder and leaves it uncached for a later retry.
+    """
+    message = None
+    result = None
+    known = {}
+    for i, candidate in enumerate(ladder):
+        if i:
+            time.sleep(GEOCODE_INTERVAL)
+        result, message = geocode_city(candidate, api_key)
+        if message:
+            break
+        known[candidate] = result
+        if result is not None:
+            break
+    if message is None:
+        # The full key records the ladder's outcome, whichever candidate resolved it
+        known[ladder[0]] = result
+    if known:
+        cache.set_many(known)
+    return result, message
+
+@st.cache_resource
+def get_shared_cache():
+    """Geocode cache backend, shared by every session (and replica, with FM_CACHE_URL)"""
+    from geocode_cache import open_cache
+
+    return open_cache(os.environ.get("FM_CACHE_URL"))
+
+@st.cache_resource
+def get_geocode_worker():
+    """Start the process-wide geocoding worker, shared by every session"""
+    from geocode_worker import GeocodeWorker
+
+    cache = get_shared_cache()
+    try:
+        api_key = st.secrets["LOCATIONIQ_KEY"]
+    except Exception:
+        api_key = ""
+
+    return GeocodeWorker(
+        lambda ladder: resolve_ladder(ladder, api_key, cache),
+        min_interval=GEOCODE_INTERVAL,
+        on_idle=cache.flush,
+    )
 
 
 def clean_city_name(city):
@@ -252,11 +337,61 @@ def clean_city_name(city):
         return m.group(1).strip(), m.group(2).strip()
     return city.strip(), None
 
+def canonical_column(col):
+    """Map an export column name to the name the app uses, or None if it isn't needed"""
+    for pattern, new_name in COLUMN_ALIASES.items():
+        if str(col).lower() == pattern.lower():
+            return new_name
+    return None
+
+def read_players_csv(uploaded_file):
+    """Yield DataFrame chunks of a CSV export, holding only the columns the app uses"""
+    import csv
+    import pandas as pd
+
+    # Sniff the header so we only parse the columns we need
+    first_line = uploaded_file.readline().decode("utf-8-sig", errors="ignore")
+    uploaded_file.seek(0)
+    try:
+        sep = csv.Sniffer().sniff(first_line, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    header = next(csv.reader([first_line], delimiter=sep), [])
+
+    usecols, seen = [], set()
+    for col in header:
+        new_name = canonical_column(col)
+        if new_name is not None and new_name not in seen:
+            usecols.append(col)
+            seen.add(new_name)
+
+    # Nothing usable: hand back the bare header so normalization can report it
+    if not {"PlayerName", "BirthCity"} <= seen:
+        yield pd.DataFrame(columns=header)
+        return
+
+    options = {"sep": sep, "usecols": usecols, "dtype": str}
+    size = getattr(uploaded_file, "size", 0) or 0
+    if size > CSV_CHUNK_THRESHOLD_BYTES:
+        # pyarrow can't stream, huge files go through the C parser in bounded chunks
+        yield from pd.read_csv(uploaded_file, engine="c", chunksize=CSV_CHUNK_ROWS, **options)
+        return
+
+    try:
+        import pyarrow  # noqa: F401
+        engine = "pyarrow"
+    except ImportError:
+        engine = "c"
+    yield pd.read_csv(uploaded_file, engine=engine, **options)
+
 def parse_file_data(uploaded_file):
     """Parse CSV or HTML file into DataFrame"""
+    import pandas as pd
+    from io import StringIO
+
     try:
         if uploaded_file.name.lower().endswith(".csv"):
-            return pd.read_csv(uploaded_file)
+            return pd.concat(read_players_csv(uploaded_file), ignore_index=True)
         else:
             html = uploaded_file.read().decode("utf-8", errors="ignore")
             tables = pd.read_html(StringIO(html))
@@ -269,24 +404,12 @@ def parse_file_data(uploaded_file):
 
 def process_players_data(df):
     """Normalize columns and process birth city data"""
-    col_map = {
-        "Nom": "PlayerName",
-        "Name": "PlayerName",
-        "Player Name": "PlayerName",
-        "Ville de naissance": "BirthCity",
-        "Birth City": "BirthCity",
-        "Birthplace": "BirthCity",
-        "Nation of Birth": "NoB",
-        "NoB": "NoB",
-        "Nationality": "Nat",
-        "2nd Nat": "2nd Nat"
-    }
-    
+    import pandas as pd
+
     for col in df.columns:
-        for pattern, new_name in col_map.items():
-            if col.lower() == pattern.lower():
-                df = df.rename(columns={col: new_name})
-                break
+        new_name = canonical_column(col)
+        if new_name is not None:
+            df = df.rename(columns={col: new_name})
     
     if "PlayerName" not in df.columns or "BirthCity" not in df.columns:
         avail = ", ".join(df.columns)
@@ -304,87 +427,272 @@ def process_players_data(df):
 
     return df
 
-def geocode_players(df: pd.DataFrame) -> pd.DataFrame:
-    """Geocode all player birthplaces with progress tracking"""
-    cache = load_cache()
+def load_players(uploaded_file):
+    """Parse and normalize an upload, streaming CSV chunks straight into normalization"""
+    import pandas as pd
 
-    unique_queries = []
-    for _, row in df.iterrows():
-        q = build_query_key(row)
-        if q not in unique_queries:
-            unique_queries.append(q)
+    if not uploaded_file.name.lower().endswith(".csv"):
+        df_raw = parse_file_data(uploaded_file)
+        if df_raw is None or not check_player_count(len(df_raw)):
+            return None
+        return process_players_data(df_raw)
 
-    to_geocode = [q for q in unique_queries if q not in cache]
+    chunks = []
+    rows = 0
+    try:
+        for chunk in read_players_csv(uploaded_file):
+            # Stop streaming as soon as the limit is crossed
+            rows += len(chunk)
+            if not check_player_count(rows):
+                return None
+            df_chunk = process_players_data(chunk)
+            if df_chunk is None:
+                return None
+            chunks.append(df_chunk)
+    except Exception as e:
+        st.error(f"Error parsing file: {str(e)}")
+        return None
+    return pd.concat(chunks, ignore_index=True)
 
-    if to_geocode:
-        st.info(f"Geocoding {len(to_geocode)} locations…")
-        prog = st.progress(0)
-        
-        for i, query_string in enumerate(to_geocode):
-            result = geocode_city(query_string, cache)
+def lookup_local(key, cache, snapshot):
+    """Cached result for key from the snapshot, then the mutable cache"""
+    if snapshot is not None:
+        result = snapshot.get(key)
+        if result is not None:
+            return result
+    return cache.get(key)
 
-            if result is None:
-                parts = [p.strip() for p in query_string.split(",")]
-                if len(parts) >= 2:
-                    fallback_query = f"{parts[0]}, {parts[-1]}"
-                    result = geocode_city(fallback_query, cache)
+def plan_geocoding(df):
+    """Resolve every distinct birthplace from the local caches in one pass.
 
-            cache[query_string] = result
-            prog.progress((i + 1) / len(to_geocode))
-            time.sleep(1.1)
+    Returns (resolved, missing): resolved maps full keys to results (None for
+    places that already failed), missing holds the ladders that still need the
+    network, minus candidates known to fail, ordered by player count.
+    """
+    snapshot = get_snapshot()
+
+    # Count players per distinct birthplace instead of walking every row
+    cols = [c for c in ("BirthCity_base", "BirthCity_paren", "NoB") if c in df.columns]
+    places = df[cols].value_counts(dropna=False)
+    ladder_players = {}
+    for values, players in places.items():
+        values = values if isinstance(values, tuple) else (values,)
+        ladder = build_query_ladder(dict(zip(cols, values)))
+        ladder_players[ladder] = ladder_players.get(ladder, 0) + players
+
+    # One batched fetch for every candidate the snapshot doesn't already answer
+    candidates = {k for ladder in ladder_players for k in ladder}
+    if snapshot is not None:
+        candidates = {k for k in candidates if k not in snapshot}
+    cache = get_shared_cache().get_many(candidates)
+
+    resolved = {}
+    missing = []
+    for ladder in sorted(ladder_players, key=ladder_players.get, reverse=True):
+        full_key = ladder[0]
+        hit = None
+        for key in ladder:
+            hit = lookup_local(key, cache, snapshot)
+            if hit is not None:
+                break
+        # A cached None for the full key means the whole ladder already failed
+        if hit is not None or full_key in cache:
+            resolved[full_key] = hit
+        else:
+            missing.append(tuple(k for k in ladder if k not in cache))
 
-        save_cache(cache)
-        prog.empty()
+    return resolved, missing
 
-    def lookup_coords(row):
-        key = build_query_key(row)
-        return cache.get(key)
+def load_seasons(uploaded_files):
+    """Load several exports as one frame, tagged with a Season column from each file name"""
+    import pandas as pd
 
-    coords_series = df.apply(lookup_coords, axis=1)
+    seasons = []
+    for uploaded_file in sorted(uploaded_files, key=lambda f: f.name):
+        df_season = load_players(uploaded_file)
+        if df_season is None:
+            return None
+        df_season["Season"] = os.path.splitext(uploaded_file.name)[0]
+        seasons.append(df_season)
+    return pd.concat(seasons, ignore_index=True)
+
+def submit_geocoding(df):
+    """Queue the birthplaces the local caches can't resolve on the shared worker"""
+    _, missing = plan_geocoding(df)
+    return get_geocode_worker().submit(st.session_state.session_id, missing)
+
+def geocode_players(df, job=None):
+    """Attach coordinates to every player from the local caches and worker results"""
+    resolved, _ = plan_geocoding(df)
+    if job is not None:
+        resolved.update(job.results)
+
+    coords_series = df.apply(build_query_key, axis=1).map(resolved)
     df["lat"] = coords_series.apply(lambda x: x["lat"] if isinstance(x, dict) else None)
     df["lon"] = coords_series.apply(lambda x: x["lon"] if isinstance(x, dict) else None)
     df["country"] = coords_series.apply(lambda x: x["country"] if isinstance(x, dict) else None)
 
     return df
 
-def create_map_html(df, map_style="OpenStreetMap"):
-    """Create Folium map with player markers"""
-    valid = df.dropna(subset=["lat", "lon"])
-    if valid.empty:
-        st.warning("No valid coordinates found to plot.")
+@st.cache_resource
+def get_tile_proxy():
+    """Start the caching tile proxy once per process, if enabled"""
+    if not TILE_PROXY_ENABLED:
         return None
+    from tile_proxy import TileProxy
+
+    port = int(os.environ.get("FM_TILE_PROXY_PORT", "8502"))
+    proxy = TileProxy(os.environ.get("FM_TILE_CACHE_DIR", "tile_cache"))
+    return proxy.start(port=port, public_url=os.environ.get("FM_TILE_PROXY_URL"))
+
+def tile_url(layer):
+    """Tile URL template for a layer, served through the proxy when it's enabled"""
+    proxy = get_tile_proxy()
+    if proxy is not None:
+        return proxy.url_template(layer)
+    from tile_proxy import TILE_LAYERS
+
+    return TILE_LAYERS[layer]
+
+def bin_coordinates(lat, lon, bin_degrees=HEATMAP_BIN_DEGREES):
+    """Aggregate coordinates into a lat/lon grid, returning [lat, lon, weight] per non-empty bin"""
+    import numpy as np
+
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+
+    lat_edges = np.arange(-90.0, 90.0 + bin_degrees, bin_degrees)
+    lon_edges = np.arange(-180.0, 180.0 + bin_degrees, bin_degrees)
+    counts, _, _ = np.histogram2d(lat, lon, bins=[lat_edges, lon_edges])
+
+    rows, cols = np.nonzero(counts)
+    if rows.size == 0:
+        return []
+    weights = counts[rows, cols]
+    centers_lat = (lat_edges[rows] + lat_edges[rows + 1]) / 2
+    centers_lon = (lon_edges[cols] + lon_edges[cols + 1]) / 2
+
+    # Normalize so the densest bin has weight 1
+    weights = weights / weights.max()
+    return np.column_stack([centers_lat, centers_lon, weights]).round(4).tolist()
+
+def add_density_layer(m, valid):
+    """Add a heatmap of binned player counts to the map"""
+    from folium.plugins import HeatMap
+
+    points = bin_coordinates(valid["lat"].to_numpy(), valid["lon"].to_numpy())
+    HeatMap(
+        points,
+        name="Player density",
+        min_opacity=0.3,
+        radius=18,
+        blur=15,
+        max_zoom=6,
+    ).add_to(m)
 
-    center_lat = valid["lat"].mean()
-    center_lon = valid["lon"].mean()
-    
-    if map_style == "Satellite":
-        tiles = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}"
-        attr = 'Esri, Maxar, Earthstar Geographics, and the GIS User Community'
-        m = folium.Map(location=[center_lat, center_lon], zoom_start=2, tiles=None, max_bounds=True)
-        
-        folium.TileLayer(
-            tiles=tiles,
-            attr=attr,
-            name="Satellite",
-            no_wrap=True
-        ).add_to(m)
-
-        folium.TileLayer(
-            tiles="https://server.arcgisonline.com/ArcGIS/rest/services/Reference/World_Boundaries_and_Places/MapServer/tile/{z}/{y}/{x}",
-            attr="Esri, HERE, Garmin, © OpenStreetMap contributors, and the GIS user community",
-            overlay=True,
-            name="Labels",
-            no_wrap=True
-        ).add_to(m)
-    else:
-        m = folium.Map(location=[center_lat, center_lon], zoom_start=2, tiles=None, max_bounds=True)
+@st.cache_resource
+def get_boundaries(zoom):
+    """Pre-simplified country boundaries for zoom, loaded once per process"""
+    from boundaries import load_boundaries
+
+    return load_boundaries(zoom)
+
+def count_players_by_country(df):
+    """Players per birth country, from NoB codes with the geocoded country as fallback"""
+    import pandas as pd
+    from constants import FIFA_TO_COUNTRY
+
+    countries = df["country"] if "country" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if "NoB" in df.columns:
+        codes = df["NoB"].astype("string").str.strip().str.upper()
+        countries = codes.map(FIFA_TO_COUNTRY).fillna(countries)
+
+    counts = countries.dropna().value_counts()
+    return counts.rename_axis("country").reset_index(name="players")
+
+def add_choropleth_layer(m, df):
+    """Shade birth countries by player count, with boundary detail following the zoom"""
+    import folium
+    from branca.colormap import linear
+    from boundaries import zoom_ranges
+
+    levels = [(get_boundaries(level), first, last) for level, first, last in zoom_ranges()]
+    if levels[0][0] is None:
+        st.info("Country boundaries haven't been built. Run `python boundaries.py <admin-0 geojson>`.")
+        return
+
+    counts = count_players_by_country(df)
+    players = dict(zip(counts["country"], counts["players"]))
+    low, high = int(counts["players"].min()), int(counts["players"].max())
+    colormap = linear.YlGnBu_09.scale(low, max(high, low + 1)).to_step(6)
+    colormap.caption = "Players per birth country"
+
+    def style(feature):
+        return {
+            "fillColor": colormap(feature["properties"]["players"]),
+            "fillOpacity": 0.75,
+            "color": "black",
+            "weight": 1,
+            "opacity": 0.4,
+        }
 
-        folium.TileLayer(
-            tiles="OpenStreetMap",
-            name="OpenStreetMap",
-            no_wrap=True
+    layers = []
+    for boundaries, first, last in levels:
+        # Only ship the countries that have players, with the count for the tooltip
+        features = [
+            {**f, "properties": {**f["properties"], "players": int(players[f["properties"]["name"]])}}
+            for f in boundaries["features"]
+            if f["properties"]["name"] in players
+        ]
+        if not features:
+            st.warning("No birth countries matched the country boundaries.")
+            return
+        layer = folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            name="Countries",
+            style_function=style,
+            highlight_function=lambda feature: {"weight": 3, "fillOpacity": 0.95},
+            tooltip=folium.GeoJsonTooltip(["name", "players"], aliases=["Country", "Players"]),
         ).add_to(m)
-
+        layers.append((layer, first, last))
+
+    colormap.add_to(m)
+    add_zoom_switch(m, layers)
+
+def add_zoom_switch(m, layers):
+    """Show each (layer, first zoom, last zoom) only inside its zoom range"""
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    switch = MacroElement()
+    switch._template = Template(ZOOM_SWITCH_TEMPLATE)
+    switch.layers = layers
+    m.add_child(switch)
+
+ZOOM_SWITCH_TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function () {
+    var map = {{ this._parent.get_name() }};
+    var levels = [{% for layer, first, last in this.layers %}[{{ layer.get_name() }}, {{ first }}, {{ last }}],{% endfor %}];
+    function update() {
+        var zoom = map.getZoom();
+        levels.forEach(function (level) {
+            var show = zoom >= level[1] && zoom <= level[2];
+            if (show && !map.hasLayer(level[0])) { map.addLayer(level[0]); }
+            if (!show && map.hasLayer(level[0])) { map.removeLayer(level[0]); }
+        });
+    }
+    map.on("zoomend", update);
+    update();
+})();
+{% endmacro %}
+"""
+
+def add_marker_layer(m, valid):
+    """Add one clustered marker per player to the map"""
+    import folium
+    import pandas as pd
+    from folium.plugins import MarkerCluster
 
     cluster = MarkerCluster(
         icon_create_function="""
@@ -490,6 +798,55 @@ def create_map_html(df, map_style="OpenStreetMap"):
             icon=folium.Icon(color="blue", icon="user", prefix="fa"),
         ).add_to(cluster)
 
+def create_map_html(df, map_style="OpenStreetMap", map_mode="Markers"):
+    """Create Folium map with player markers or a density heatmap"""
+    import folium
+
+    valid = df.dropna(subset=["lat", "lon"])
+    if valid.empty:
+        st.warning("No valid coordinates found to plot.")
+        return None
+
+    center_lat = valid["lat"].mean()
+    center_lon = valid["lon"].mean()
+    
+    if map_style == "Satellite":
+        tiles = tile_url("esri-imagery")
+        attr = 'Esri, Maxar, Earthstar Geographics, and the GIS User Community'
+        m = folium.Map(location=[center_lat, center_lon], zoom_start=MAP_ZOOM_START, tiles=None, max_bounds=True)
+        
+        folium.TileLayer(
+            tiles=tiles,
+            attr=attr,
+            name="Satellite",
+            no_wrap=True
+        ).add_to(m)
+
+        folium.TileLayer(
+            tiles=tile_url("esri-labels"),
+            attr="Esri, HERE, Garmin, © OpenStreetMap contributors, and the GIS user community",
+            overlay=True,
+            name="Labels",
+            no_wrap=True
+        ).add_to(m)
+    else:
+        m = folium.Map(location=[center_lat, center_lon], zoom_start=MAP_ZOOM_START, tiles=None, max_bounds=True)
+
+        folium.TileLayer(
+            tiles=tile_url("osm"),
+            attr="© OpenStreetMap contributors",
+            name="OpenStreetMap",
+            no_wrap=True
+        ).add_to(m)
+
+
+    if map_mode == "Density":
+        add_density_layer(m, valid)
+    elif map_mode == "Countries":
+        add_choropleth_layer(m, df)
+    else:
+        add_marker_layer(m, valid)
+
     # Fit map to show all markers
     if len(valid) > 1:
         sw = valid[["lat", "lon"]].min().values.tolist()
@@ -504,6 +861,40 @@ def create_map_html(df, map_style="OpenStreetMap"):
     return m.get_root().render()
 
 
+def tile_layers(map_style="OpenStreetMap"):
+    """Tile layer specs for the Leaflet pages that don't go through folium"""
+    if map_style == "Satellite":
+        return [
+            {"url": tile_url("esri-imagery"), "attribution": "Esri, Maxar, Earthstar Geographics, and the GIS User Community"},
+            {"url": tile_url("esri-labels"), "attribution": "Esri, HERE, Garmin, © OpenStreetMap contributors, and the GIS user community"},
+        ]
+    return [{"url": tile_url("osm"), "attribution": "© OpenStreetMap contributors"}]
+
+def show_filterable_map(df, map_style="OpenStreetMap"):
+    """Render the client-side filtering map, returning the last marker selection"""
+    from player_map import encode_players, player_map
+
+    # Encode once per dataset, reruns reuse the same payload
+    if st.session_state.get("player_map_data") is None:
+        st.session_state.player_map_data = encode_players(df)
+
+    return player_map(st.session_state.player_map_data, tile_layers(map_style), height=800, key="player_map")
+
+def show_timeline_map(df, map_style="OpenStreetMap"):
+    """Render the season slider map; seasons are applied as deltas in the browser"""
+    import streamlit.components.v1 as components
+    from timeline import encode_timeline, render_timeline_html
+
+    if st.session_state.get("timeline_data") is None:
+        st.session_state.timeline_data = encode_timeline(df)
+
+    components.html(
+        render_timeline_html(st.session_state.timeline_data, tile_layers(map_style), height=800),
+        height=800,
+        scrolling=False,
+    )
+
+
 # Header
 st.markdown(
     """
@@ -515,8 +906,29 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Upload or display map
-if st.session_state.players_data is None:
+# Upload, wait for geocoding, or display map
+if st.session_state.geocode_job is not None:
+    # Geocoding runs on the shared worker; poll it until this session's job is done
+    job = st.session_state.geocode_job
+    df_proc = st.session_state.pending_players
+    if job.done:
+        st.session_state.geocode_messages = list(dict.fromkeys(job.messages))
+        with admitted("geocode"), profiled("geocode"):
+            st.session_state.players_data = geocode_players(df_proc, job)
+        st.session_state.player_map_data = None
+        st.session_state.timeline_data = None
+        st.session_state.geocode_job = None
+        del st.session_state["pending_players"]
+        st.rerun()
+    else:
+        st.success(f"✅ Loaded {len(df_proc)} players.")
+        st.info(f"Geocoding {len(job.queries)} locations…")
+        st.progress(job.progress)
+        for message in job.messages[-3:]:
+            st.warning(message)
+        time.sleep(1)
+        st.rerun()
+elif st.session_state.players_data is None:
     # Upload section
     st.markdown(
         """
@@ -582,36 +994,64 @@ if st.session_state.players_data is None:
     
     st.markdown("<hr style='margin: 20px 0; border-color: var(--secondary-text-color, #666666); opacity: 0.3;'>", unsafe_allow_html=True)
     
-    uploaded_file = st.file_uploader(
-        "Choose your Football Manager export file",
-        type=["html", "csv"],
-        key="upload_file",
-        help="Must contain at least 'Name' and 'Birth City' columns",
+    compare_seasons = st.toggle(
+        "Compare seasons",
+        help="Upload one export per season of the same save. Files are ordered by name, "
+             "which is also used as the season label (e.g. 2025-26.html).",
     )
-    if uploaded_file is not None:
-        with st.spinner("Processing and geocoding…"):
-            df_raw = parse_file_data(uploaded_file)
-            if df_raw is not None:
-                df_proc = process_players_data(df_raw)
-                if df_proc is not None:
-                    st.success(f"✅ Loaded {len(df_proc)} players.")
-                    with st.spinner("Geocoding…"):
-                        df_geo = geocode_players(df_proc)
-                        # Store data and refresh
-                        st.session_state.players_data = df_geo
-                        st.rerun()
+    df_proc = None
+    if compare_seasons:
+        uploaded_files = st.file_uploader(
+            "Choose your Football Manager exports, one per season",
+            type=["html", "csv"],
+            accept_multiple_files=True,
+            key="upload_files",
+            help="Must contain at least 'Name' and 'Birth City' columns",
+        )
+        if len(uploaded_files or []) > 1 and st.button("Build timeline"):
+            if check_upload_size(uploaded_files):
+                with st.spinner("Processing…"):
+                    with admitted("parse"), profiled("parse"):
+                        df_proc = load_seasons(uploaded_files)
+                if df_proc is not None and not check_player_count(len(df_proc)):
+                    df_proc = None
+    else:
+        uploaded_file = st.file_uploader(
+            "Choose your Football Manager export file",
+            type=["html", "csv"],
+            key="upload_file",
+            help="Must contain at least 'Name' and 'Birth City' columns",
+        )
+        if uploaded_file is not None and check_upload_size([uploaded_file]):
+            with st.spinner("Processing…"):
+                with admitted("parse"), profiled("parse"):
+                    df_proc = load_players(uploaded_file)
+    if df_proc is not None:
+        # Hand off to the shared worker and poll on later reruns
+        with admitted("geocode"), profiled("submit"):
+            st.session_state.pending_players = df_proc
+            st.session_state.geocode_job = submit_geocoding(df_proc)
+        st.rerun()
 else:
     # Stats display
     df = st.session_state.players_data
-    valid = df.dropna(subset=["lat", "lon"])  
-    unique_cities = df["BirthCity_base"].nunique()
-    unique_ctrs   = df["country"].dropna().nunique()
+    has_seasons = "Season" in df.columns and df["Season"].nunique() > 1
+    if has_seasons:
+        # Everything but the timeline counts each player once, at their latest season
+        from timeline import latest_seasons
+
+        players = latest_seasons(df)
+    else:
+        players = df
+    valid = players.dropna(subset=["lat", "lon"])
+    unique_cities = players["BirthCity_base"].nunique()
+    unique_ctrs   = players["country"].dropna().nunique()
 
     c1, c2, c3, c4 = st.columns(4, gap="large")
     with c1:
         st.markdown(
             f"""<div class="stats-card">
-                    <h3>{len(df)}</h3>
+                    <h3>{len(players)}</h3>
                     <p>Total Players</p>
                 </div>""",
             unsafe_allow_html=True,
@@ -641,6 +1081,12 @@ else:
             unsafe_allow_html=True,
         )
 
+    if has_seasons:
+        st.caption(
+            f"{df['Season'].nunique()} seasons uploaded: each player is counted once, at their "
+            "latest season. The Timeline display steps through every season."
+        )
+
     # Map style options
     map_style = st.radio(
         "Map Style:",
@@ -648,11 +1094,44 @@ else:
         horizontal=True
     )
 
+    # Season comparisons open on the timeline, large squads on the density view
+    map_modes = ["Markers", "Density", "Countries", "Filterable"]
+    if has_seasons:
+        map_modes.append("Timeline")
+        default_mode = len(map_modes) - 1
+    else:
+        default_mode = 1 if len(valid) > DENSITY_MODE_THRESHOLD else 0
+    map_mode = st.radio(
+        "Display:",
+        map_modes,
+        index=default_mode,
+        horizontal=True,
+        help="Density aggregates players into a heatmap, which stays fast for very large datasets. "
+             "Countries shades each birth country by player count. "
+             "Filterable lets you filter by nationality and birth country without reloading the map. "
+             "Timeline steps through the uploaded seasons.",
+    )
+
     # Display map
-    map_html = create_map_html(df, map_style)
-    if map_html is not None:
+    if map_mode == "Timeline":
+        st.markdown("## World Map", unsafe_allow_html=True)
+        with admitted("map"), profiled("map"):
+            show_timeline_map(df, map_style)
+    elif map_mode == "Filterable":
+        # Filtering happens in the browser, the script only reruns on marker selection
         st.markdown("## World Map", unsafe_allow_html=True)
-        components.html(map_html, height=800, scrolling=False)
+        with admitted("map"), profiled("map"):
+            selection = show_filterable_map(players, map_style)
+        if selection:
+            st.caption(f"Selected: {selection['name']} ({selection['city']})")
+    else:
+        with admitted("map"), profiled("map"):
+            map_html = create_map_html(players, map_style, map_mode)
+        if map_html is not None:
+            st.markdown("## World Map", unsafe_allow_html=True)
+            import streamlit.components.v1 as components
+
+            components.html(map_html, height=800, scrolling=False)
     # Reset button
     st.markdown("<div class='clear-container'>", unsafe_allow_html=True)
     if st.button("Clear Data"):
@@ -661,6 +1140,14 @@ else:
             st.session_state["upload_file"] = None
         if "geocode_cache" in st.session_state:
             del st.session_state["geocode_cache"]
+        if "geocode_messages" in st.session_state:
+            del st.session_state["geocode_messages"]
+        if "run_profile" in st.session_state:
+            del st.session_state["run_profile"]
+        if "player_map_data" in st.session_state:
+            del st.session_state["player_map_data"]
+        if "timeline_data" in st.session_state:
+            del st.session_state["timeline_data"]
         st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -670,6 +1157,22 @@ else:
         with st.expander(f"⚠️ Failed to geocode {len(failed)} players"):
             st.dataframe(failed[["PlayerName", "BirthCity", "BirthCity_base", "BirthCity_paren"]], use_container_width=True)
             st.info("Try adding country names or parentheses to improve accuracy.")
+            for message in st.session_state.get("geocode_messages", []):
+                st.warning(message)
+
+    # Profile report for this session's run
+    if PROFILING:
+        run_profile = st.session_state.run_profile
+        with st.expander("🩺 Diagnostics"):
+            st.caption("Geocoding network calls run on the shared background worker and are not included.")
+            st.code(run_profile.report(), language=None)
+            st.download_button(
+                "Download profile (.prof)",
+                data=run_profile.dump(),
+                file_name="fm-birthplace-map.prof",
+                mime="application/octet-stream",
+                help="Open with pstats, snakeviz or gprof2dot",
+            )
 
 
 # Footer
@@ -0,0 +1,112 @@
+"""Import-time budget check for the upload screen.
+
+Runs `python -X importtime -c "import app"` with no file uploaded, which
+executes the script up to the upload screen, and fails if:
+
+- any module in LAZY_MODULES gets imported (they belong to later stages), or
+- the time spent importing app on top of streamlit itself exceeds the budget.
+
+Usage:
+
+    python bench_import_time.py [--budget-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must only be loaded once a stage needs them
+LAZY_MODULES = (
+    "pandas",
+    "numpy",
+    "folium",
+    "branca",
+    "requests",
+    "constants",
+    "geocode_snapshot",
+    "geocode_worker",
+    "geocode_cache",
+    "profiling",
+    "tile_proxy",
+    "boundaries",
+    "player_map",
+    "timeline",
+    "admission",
+)
+DEFAULT_BUDGET_MS = 150
+BASELINE = "import streamlit as st; st.set_page_config(layout='wide')"
+
+
+def parse_importtime(stderr):
+    """Return ({module: cumulative microseconds}, {module: module that imported it}) from -X importtime output"""
+    timings = {}
+    parents = {}
+    # Children are printed before their parent, one indent level deeper
+    pending = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        module = name.strip()
+        while pending and pending[-1][0] > depth:
+            parents.setdefault(pending.pop()[1], module)
+        pending.append((depth, module))
+        # Each module is only recorded the first time it is imported
+        if module not in timings:
+            timings[module] = int(cumulative)
+    return timings, parents
+
+
+def importtime(statement):
+    """Run statement in a fresh interpreter and return parse_importtime's result, or None on failure"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=here,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr)
+        print(f"{statement} failed")
+        return None
+    return parse_importtime(proc.stderr)
+
+
+def run(budget_ms):
+    # Streamlit imports some of its own modules lazily on first use, so the
+    # baseline configures the page the way app does, minus app's arguments
+    baseline = importtime(BASELINE)
+    app_run = importtime("import app")
+    if baseline is None or app_run is None:
+        return 1
+    baseline, _ = baseline
+    timings, parents = app_run
+
+    app_us = timings.get("app", 0)
+    streamlit_us = timings.get("streamlit", 0)
+    own_ms = (app_us - streamlit_us) / 1000
+
+    failed = False
+    # Whatever streamlit pulls in by itself isn't ours to defer
+    loaded = [m for m in LAZY_MODULES if m in timings and m not in baseline]
+    if loaded:
+        via = [f"{m} (via {parents[m]})" if m in parents else m for m in loaded]
+        print(f"FAIL: eagerly imported {', '.join(via)}")
+        failed = True
+
+    print(f"import app: {app_us / 1000:.1f} ms total, {own_ms:.1f} ms excluding streamlit "
+          f"(budget {budget_ms} ms)")
+    if own_ms > budget_ms:
+        print("FAIL: import-time budget exceeded")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+    sys.exit(run(args.budget_ms))
@@ -0,0 +1,275 @@
+"""Country boundaries, pre-simplified per zoom level for the choropleth layer.
+
+Build once from a Natural Earth admin-0 GeoJSON (map units keep England,
+Scotland, Wales and Northern Ireland apart, which matches FM's nations):
+
+    python boundaries.py ne_50m_admin_0_map_units.geojson boundaries
+
+This writes boundaries/z<zoom>.geojson for every level in ZOOM_LEVELS,
+simplified to about one screen pixel at that zoom, with country names
+normalized to the names used in constants.FIFA_TO_COUNTRY, and lists the
+FM nations that ended up without a boundary.
+"""
+import json
+import math
+import os
+import sys
+
+BOUNDARIES_DIR = "boundaries"
+# Each level is shown from its own zoom up to the next level's (zoom_ranges),
+# so it is never drawn at more than 2 screen pixels of error
+ZOOM_LEVELS = (0, 2, 4)
+MAX_ZOOM = 18
+
+# Natural Earth names (short NAME and long ADMIN/GEOUNIT forms) -> names used by FIFA_TO_COUNTRY
+BOUNDARY_NAME_ALIASES = {
+    "United States of America": "United States",
+    "Côte d'Ivoire": "Ivory Coast",
+    "Dem. Rep. Congo": "DR Congo",
+    "Democratic Republic of the Congo": "DR Congo",
+    "Republic of the Congo": "Congo",
+    "Bosnia and Herz.": "Bosnia and Herzegovina",
+    "Czechia": "Czech Republic",
+    "Czech Rep.": "Czech Republic",
+    "Ireland": "Republic of Ireland",
+    "N. Ireland": "Northern Ireland",
+    "Taiwan": "Chinese Taipei",
+    "eSwatini": "Eswatini",
+    "Swaziland": "Eswatini",
+    "Central African Rep.": "Central African Republic",
+    "Dominican Rep.": "Dominican Republic",
+    "Eq. Guinea": "Equatorial Guinea",
+    "Guinea Bissau": "Guinea-Bissau",
+    "S. Sudan": "South Sudan",
+    "Solomon Is.": "Solomon Islands",
+    "Macedonia": "North Macedonia",
+    "N. Macedonia": "North Macedonia",
+    "Republic of Serbia": "Serbia",
+    "United Republic of Tanzania": "Tanzania",
+    "The Bahamas": "Bahamas",
+    "Cabo Verde": "Cape Verde",
+    "N. Cyprus": "Northern Cyprus",
+    "W. Sahara": "Western Sahara",
+    "Falkland Is.": "Falkland Islands",
+    "Faeroe Is.": "Faroe Islands",
+    "São Tomé and Principe": "São Tomé and Príncipe",
+    "Sao Tome and Principe": "São Tomé and Príncipe",
+    "Republic of Korea": "South Korea",
+    "Dem. Rep. Korea": "North Korea",
+    "Lao PDR": "Laos",
+    "Russian Federation": "Russia",
+    "Brunei Darussalam": "Brunei",
+    "Türkiye": "Turkey",
+    "East Timor": "Timor-Leste",
+    "Federated States of Micronesia": "Micronesia",
+    "Antigua and Barb.": "Antigua and Barbuda",
+    "St. Vin. and Gren.": "Saint Vincent and the Grenadines",
+    "St. Kitts and Nevis": "Saint Kitts and Nevis",
+    "St. Lucia": "Saint Lucia",
+    "St-Barthélemy": "Saint Barthélemy",
+    "St-Martin": "Saint Martin",
+    "St. Pierre and Miquelon": "Saint Pierre and Miquelon",
+    "Turks and Caicos Is.": "Turks and Caicos Islands",
+    "Cayman Is.": "Cayman Islands",
+    "British Virgin Is.": "British Virgin Islands",
+    "U.S. Virgin Is.": "U.S. Virgin Islands",
+    "United States Virgin Islands": "U.S. Virgin Islands",
+    "N. Mariana Is.": "Northern Mariana Islands",
+    "Marshall Is.": "Marshall Islands",
+    "Cook Is.": "Cook Islands",
+    "Wallis and Futuna Is.": "Wallis and Futuna",
+    "Fr. Polynesia": "Tahiti",
+    "French Polynesia": "Tahiti",
+    "Fr. Guiana": "French Guiana",
+    "Hong Kong S.A.R.": "Hong Kong",
+    "Macao S.A.R": "Macau",
+    "Macao": "Macau",
+    "Aland": "Åland",
+    "Åland Islands": "Åland",
+    "Vatican": "Vatican City",
+    "West Bank": "Palestine",
+    "Gaza": "Palestine",
+    "Somaliland": "Somalia",
+}
+# Feature properties tried for a name FM knows, most specific first. Map
+# units split some countries into parts FM doesn't have (Belgium's regions,
+# Bosnia's entities); those fall through to GEOUNIT/ADMIN/SOVEREIGNT, while
+# parts FM does know (England, Scotland, Wales, N. Ireland) match on NAME.
+NAME_PROPERTIES = ("NAME", "GEOUNIT", "ADMIN", "SOVEREIGNT", "name")
+
+
+def feature_name(props, known):
+    """Name from FIFA_TO_COUNTRY for a feature, else its own (aliased) name, or None"""
+    names = [BOUNDARY_NAME_ALIASES.get(n, n) for n in (props.get(k) for k in NAME_PROPERTIES) if n]
+    for name in names:
+        if name in known:
+            return name
+    return names[0] if names else None
+
+
+def pixel_tolerance(zoom):
+    """Degrees covered by one 256px tile pixel at zoom"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of one closed ring"""
+    import numpy as np
+
+    pts = np.asarray(points, dtype=float)
+    if len(pts) <= 4:
+        return pts
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = pts[i], pts[j]
+        seg = pts[i + 1:j]
+        dx, dy = b - a
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            # Closed ring: first and last points coincide
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (seg[:, 1] - a[1]) - dy * (seg[:, 0] - a[0])) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack.append((i, i + 1 + k))
+            stack.append((i + 1 + k, j))
+    return pts[keep]
+
+
+def simplify_polygons(polygons, tolerance, decimals):
+    """Simplify a list of polygons (lists of rings), dropping rings that collapse"""
+    simplified = []
+    for rings in polygons:
+        kept = []
+        for ring in rings:
+            ring = simplify_ring(ring, tolerance).round(decimals)
+            if len(ring) >= 4:
+                kept.append(ring.tolist())
+        if kept:
+            simplified.append(kept)
+    return simplified
+
+
+def minimal_ring(ring, decimals):
+    """Smallest valid ring standing in for a shape below the tolerance.
+
+    Keeps the ring's extreme points in their original order; if rounding
+    merges those, falls back to a square one rounding step wide.
+    """
+    import numpy as np
+
+    pts = np.asarray(ring, dtype=float)
+    extremes = {int(i) for i in (pts[:, 0].argmin(), pts[:, 0].argmax(),
+                                 pts[:, 1].argmin(), pts[:, 1].argmax())}
+    kept = []
+    for point in pts[sorted(extremes)].round(decimals).tolist():
+        if point not in kept:
+            kept.append(point)
+    if len(kept) < 3:
+        step = 10.0 ** -decimals
+        lon, lat = pts.mean(axis=0).round(decimals).tolist()
+        kept = [[lon, lat], [lon + step, lat], [lon + step, lat + step], [lon, lat + step]]
+        kept = np.round(kept, decimals).tolist()
+    return kept + [kept[0]]
+
+
+def simplify_geometry(geometry, zoom):
+    """Simplified MultiPolygon coordinates for zoom, or None for non-polygon geometry"""
+    if geometry.get("type") not in ("Polygon", "MultiPolygon"):
+        return None
+
+    polygons = geometry["coordinates"]
+    if geometry["type"] == "Polygon":
+        polygons = [polygons]
+
+    tolerance = pixel_tolerance(zoom)
+    # Anything finer than a tenth of the tolerance is invisible at this zoom
+    decimals = max(1, min(5, math.ceil(-math.log10(tolerance / 10))))
+    polygons = simplify_polygons(polygons, tolerance, decimals)
+    if not polygons:
+        # Tiny country: a minimal ring for its largest polygon rather than dropping it
+        largest = max(geometry["coordinates"] if geometry["type"] == "MultiPolygon"
+                      else [geometry["coordinates"]], key=lambda p: len(p[0]))
+        polygons = [[minimal_ring(largest[0], decimals)]]
+    return polygons
+
+
+def build_boundaries(source, path=BOUNDARIES_DIR, zoom_levels=ZOOM_LEVELS):
+    """Write one simplified GeoJSON per zoom level from a source FeatureCollection.
+
+    Features that resolve to the same name are merged into one. Returns
+    ({zoom: file size}, FIFA_TO_COUNTRY names that have no boundary).
+    """
+    from constants import FIFA_TO_COUNTRY
+
+    known = set(FIFA_TO_COUNTRY.values())
+    with open(source, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+
+    # name -> geometries of every feature that maps to it
+    grouped = {}
+    for feature in features:
+        name = feature_name(feature.get("properties") or {}, known)
+        if name:
+            grouped.setdefault(name, []).append(feature.get("geometry") or {})
+
+    os.makedirs(path, exist_ok=True)
+    sizes = {}
+    for zoom in zoom_levels:
+        simplified = []
+        for name, geometries in grouped.items():
+            polygons = []
+            for geometry in geometries:
+                polygons.extend(simplify_geometry(geometry, zoom) or [])
+            if polygons:
+                simplified.append({
+                    "type": "Feature",
+                    "properties": {"name": name},
+                    "geometry": {"type": "MultiPolygon", "coordinates": polygons},
+                })
+        out = os.path.join(path, f"z{zoom}.geojson")
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": simplified}, f,
+                      separators=(",", ":"), ensure_ascii=False)
+        sizes[zoom] = os.path.getsize(out)
+    return sizes, sorted(known - set(grouped))
+
+
+def zoom_ranges(zoom_levels=ZOOM_LEVELS):
+    """(level, first zoom, last zoom) for every level, covering zooms 0 to MAX_ZOOM"""
+    ranges = []
+    for i, level in enumerate(zoom_levels):
+        first = 0 if i == 0 else level
+        last = zoom_levels[i + 1] - 1 if i + 1 < len(zoom_levels) else MAX_ZOOM
+        ranges.append((level, first, last))
+    return ranges
+
+
+def load_boundaries(zoom, path=BOUNDARIES_DIR):
+    """Load the prebuilt boundaries closest to zoom, or None if they haven't been built"""
+    available = [z for z in ZOOM_LEVELS if os.path.exists(os.path.join(path, f"z{z}.geojson"))]
+    if not available:
+        return None
+    best = min(available, key=lambda z: abs(z - zoom))
+    with open(os.path.join(path, f"z{best}.geojson"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python boundaries.py <admin-0 geojson> [output dir]")
+        sys.exit(1)
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else BOUNDARIES_DIR
+    sizes, missing = build_boundaries(sys.argv[1], out_dir)
+    for zoom, size in sizes.items():
+        print(f"z{zoom}: {size / 1024:.0f} KiB")
+    if missing:
+        print(f"No boundary for {len(missing)} FM nations (never shaded): {', '.join(missing)}")
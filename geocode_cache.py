@@ -0,0 +1,280 @@
+"""Mutable geocode cache backends.
+
+Every backend maps query keys to a result dict, or to None for queries that
+are known to fail, and works in batches so an upload's keys cost one round
+trip:
+
+    get_many(keys)  -> {key: result} for the keys the backend knows
+    set_many(items) -> store {key: result}
+    flush()         -> persist anything buffered
+
+JsonFileBackend is the single-replica default (geocode_cache.json).
+RedisBackend shares the cache between replicas over the Redis protocol. It
+is wrapped in a NearCache so repeated keys stay in process, and it degrades
+to the near-cache alone while the server is unreachable.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+CACHE_FILE = "geocode_cache.json"
+# Keys per MGET, so a huge upload doesn't build one enormous command
+MGET_BATCH = 500
+# Entries the in-process near-cache keeps before evicting the least recently used
+NEAR_CACHE_SIZE = 50000
+
+_MISSING = object()
+
+
+class CacheBackend:
+    """Interface shared by all cache backends"""
+
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def set_many(self, items):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class JsonFileBackend(CacheBackend):
+    """Whole cache in memory, written back to a JSON file on flush"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+
+    def get_many(self, keys):
+        with self._lock:
+            return {k: self._data[k] for k in keys if k in self._data}
+
+    def set_many(self, items):
+        with self._lock:
+            self._data.update(items)
+            self._dirty = True
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = dict(self._data)
+            self._dirty = False
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            pass
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """Minimal pipelined Redis protocol client: MGET for reads, SET for writes.
+
+    Any connection or protocol failure marks the backend down for
+    retry_after seconds; meanwhile reads return nothing and writes are dropped.
+    """
+
+    def __init__(self, url, prefix="fm-geocode:", ttl=None, timeout=2.0, retry_after=30.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+        self._down_until = 0.0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self._down_until
+
+    @staticmethod
+    def _encode(*args):
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise RedisError("connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(body.decode("utf-8", errors="replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._pipeline(setup)
+
+    def _close(self):
+        for closable in (self._reader, self._sock):
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _pipeline(self, commands):
+        """Send every command in one write and read all the replies"""
+        self._sock.sendall(b"".join(self._encode(*cmd) for cmd in commands))
+        return [self._read_reply() for _ in commands]
+
+    def execute(self, commands):
+        """Run a pipeline, or return None if the server is unavailable"""
+        if not commands or not self.available:
+            return None
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._pipeline(commands)
+            except (OSError, RedisError, ValueError):
+                self._close()
+                self._down_until = time.monotonic() + self.retry_after
+                return None
+
+    def get_many(self, keys):
+        keys = list(keys)
+        batches = [keys[i:i + MGET_BATCH] for i in range(0, len(keys), MGET_BATCH)]
+        replies = self.execute([("MGET", *(self.prefix + k for k in batch)) for batch in batches])
+        if replies is None:
+            return {}
+        found = {}
+        for batch, values in zip(batches, replies):
+            for key, value in zip(batch, values):
+                if value is None:
+                    continue
+                try:
+                    result = json.loads(value)
+                except ValueError:
+                    # Not ours or corrupted: treat as a miss, the next lookup overwrites it
+                    continue
+                if result is None or isinstance(result, dict):
+                    found[key] = result
+        return found
+
+    def set_many(self, items):
+        ttl = ("EX", self.ttl) if self.ttl else ()
+        self.execute([
+            ("SET", self.prefix + key, json.dumps(result), *ttl)
+            for key, result in items.items()
+        ])
+
+
+class NearCache(CacheBackend):
+    """In-process LRU cache in front of a shared backend.
+
+    Entries expire after ttl seconds like the backend's, so a long-running
+    replica doesn't keep serving results the shared cache has dropped.
+    """
+
+    def __init__(self, backend, max_entries=NEAR_CACHE_SIZE, ttl=None):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expiry time or None, result), least recently used first
+        self._local = OrderedDict()
+
+    def _lookup(self, key, now):
+        entry = self._local.get(key)
+        if entry is None:
+            return _MISSING
+        expires, result = entry
+        if expires is not None and now >= expires:
+            del self._local[key]
+            return _MISSING
+        self._local.move_to_end(key)
+        return result
+
+    def _remember(self, items):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        for key, result in items.items():
+            self._local[key] = (expires, result)
+            self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                result = self._lookup(key, now)
+                if result is not _MISSING:
+                    found[key] = result
+        missing = [k for k in keys if k not in found]
+        if missing:
+            fetched = self.backend.get_many(missing)
+            with self._lock:
+                self._remember(fetched)
+            found.update(fetched)
+        return found
+
+    def set_many(self, items):
+        with self._lock:
+            self._remember(items)
+        self.backend.set_many(items)
+
+    def flush(self):
+        self.backend.flush()
+
+
+def open_cache(url=None):
+    """Shared Redis-backed cache for redis:// URLs, the local JSON file otherwise"""
+    if url and url.startswith("redis://"):
+        ttl = os.environ.get("FM_CACHE_TTL")
+        ttl = int(ttl) if ttl else None
+        return NearCache(RedisBackend(url, ttl=ttl), ttl=ttl)
+    return JsonFileBackend(url or CACHE_FILE)
@@ -0,0 +1,125 @@
+"""Read-only, memory-mapped snapshot of resolved geocoding queries.
+
+The snapshot is a directory of plain .npy files so it can be opened with
+numpy's memory mapping and queried without parsing anything at load time:
+
+    manifest.json   format version, build time and entry count
+    keys.npy        sorted query keys, fixed-width UTF-8 bytes
+    coords.npy      float64 (n, 2) array of lat/lon, aligned with keys
+    country.npy     int32 index into countries.json, aligned with keys
+    countries.json  country name table
+
+Build it from an existing geocode cache with:
+
+    python geocode_snapshot.py geocode_cache.json geocode_snapshot
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = "geocode_snapshot"
+
+
+class GeocodeSnapshot:
+    """Lookup table over a memory-mapped snapshot directory"""
+
+    def __init__(self, path=SNAPSHOT_DIR):
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+
+        self.manifest = manifest
+        self.keys = np.load(os.path.join(path, "keys.npy"), mmap_mode="r")
+        self.coords = np.load(os.path.join(path, "coords.npy"), mmap_mode="r")
+        self.country = np.load(os.path.join(path, "country.npy"), mmap_mode="r")
+        with open(os.path.join(path, "countries.json"), "r") as f:
+            self.countries = json.load(f)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _index(self, query):
+        if not isinstance(query, str) or not len(self.keys):
+            return None
+        key = query.encode("utf-8")
+        # Keys longer than the table width can't be in the snapshot
+        if len(key) > self.keys.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+    def __contains__(self, query):
+        return self._index(query) is not None
+
+    def get(self, query, default=None):
+        """Return the cached result dict for query, or default"""
+        i = self._index(query)
+        if i is None:
+            return default
+        lat, lon = self.coords[i]
+        return {
+            "lat": float(lat),
+            "lon": float(lon),
+            "country": self.countries[int(self.country[i])],
+        }
+
+
+def load_snapshot(path=SNAPSHOT_DIR):
+    """Open the snapshot at path, or return None if there isn't a usable one"""
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    try:
+        return GeocodeSnapshot(path)
+    except Exception:
+        return None
+
+
+def build_snapshot(cache, path=SNAPSHOT_DIR):
+    """Write the resolved entries of a geocode cache dict as a snapshot directory"""
+    resolved = {
+        q.encode("utf-8"): r
+        for q, r in cache.items()
+        if isinstance(q, str) and isinstance(r, dict)
+    }
+    keys = sorted(resolved)
+
+    countries = sorted({resolved[k].get("country") or "Unknown" for k in keys})
+    country_index = {name: i for i, name in enumerate(countries)}
+
+    width = max((len(k) for k in keys), default=1)
+    key_array = np.array(keys, dtype=f"S{width}")
+    coords = np.array(
+        [[resolved[k]["lat"], resolved[k]["lon"]] for k in keys], dtype=np.float64
+    ).reshape(-1, 2)
+    country = np.array(
+        [country_index[resolved[k].get("country") or "Unknown"] for k in keys], dtype=np.int32
+    )
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "keys.npy"), key_array)
+    np.save(os.path.join(path, "coords.npy"), coords)
+    np.save(os.path.join(path, "country.npy"), country)
+    with open(os.path.join(path, "countries.json"), "w") as f:
+        json.dump(countries, f)
+    # Manifest goes last so a half-written snapshot is never picked up
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(
+            {"version": SNAPSHOT_VERSION, "built": int(time.time()), "entries": len(keys)},
+            f,
+        )
+    return len(keys)
+
+
+if __name__ == "__main__":
+    cache_file = sys.argv[1] if len(sys.argv) > 1 else "geocode_cache.json"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR
+    with open(cache_file, "r") as f:
+        count = build_snapshot(json.load(f), out_dir)
+    print(f"Wrote {count} entries to {out_dir}")
@@ -0,0 +1,129 @@
+"""Process-wide background geocoding worker shared by all sessions.
+
+Sessions submit their missing queries as a GeocodeJob and poll it on later
+reruns instead of blocking the script thread. Each query is a ladder of
+candidate keys, most specific first; its first key identifies it. A single
+thread resolves queries for everyone, which gives us:
+
+- coalescing: a query already queued or in flight for another session is
+  not requested twice, every waiting job receives the same result
+- one rate budget: requests are spaced by min_interval no matter how many
+  sessions are uploading
+- fairness: sessions are served round-robin, one query at a time, so a
+  large upload can't starve a small one
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class GeocodeJob:
+    """A session's batch of queries, filled in by the worker as they resolve.
+
+    queries and results are keyed by each ladder's first key.
+    """
+
+    def __init__(self, owner, queries):
+        self.owner = owner
+        self.queries = list(dict.fromkeys(queries))
+        self.results = {}
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def _complete(self, query, result, message=None):
+        with self._lock:
+            self.results[query] = result
+            if message:
+                self.messages.append(message)
+
+    @property
+    def done(self):
+        return len(self.results) >= len(self.queries)
+
+    @property
+    def progress(self):
+        if not self.queries:
+            return 1.0
+        return len(self.results) / len(self.queries)
+
+
+class GeocodeWorker:
+    """Single background thread resolving queued queries for all sessions.
+
+    resolve(ladder) must return (result, message) and may not touch streamlit.
+    on_idle() is called from the worker thread whenever the queue drains.
+    """
+
+    def __init__(self, resolve, min_interval=1.1, on_idle=None):
+        self._resolve = resolve
+        self._min_interval = min_interval
+        self._on_idle = on_idle
+        self._cond = threading.Condition()
+        # owner -> ladders still waiting, in round-robin order
+        self._queues = OrderedDict()
+        # key -> jobs waiting on it, covers both queued and in-flight ladders
+        self._waiters = {}
+        self._thread = None
+
+    def submit(self, owner, ladders):
+        """Queue ladders on behalf of owner, in priority order, and return a job to poll"""
+        ladders = [tuple(ladder) for ladder in ladders]
+        job = GeocodeJob(owner, [ladder[0] for ladder in ladders])
+        with self._cond:
+            for ladder in ladders:
+                key = ladder[0]
+                if key in self._waiters:
+                    if job not in self._waiters[key]:
+                        self._waiters[key].append(job)
+                    continue
+                self._waiters[key] = [job]
+                self._queues.setdefault(owner, deque()).append(ladder)
+            self._ensure_thread()
+            self._cond.notify()
+        return job
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="geocode-worker", daemon=True
+            )
+            self._thread.start()
+
+    def _next_query(self):
+        # Take one ladder from the first owner, then move them to the back
+        owner, queue = next(iter(self._queues.items()))
+        ladder = queue.popleft()
+        del self._queues[owner]
+        if queue:
+            self._queues[owner] = queue
+        return ladder
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                ladder = self._next_query()
+            key = ladder[0]
+
+            try:
+                result, message = self._resolve(ladder)
+            except Exception as e:
+                result, message = None, f"Geocoding exception for '{key}': {e}"
+
+            with self._cond:
+                jobs = self._waiters.pop(key, [])
+                idle = not self._queues
+            for job in jobs:
+                job._complete(key, result, message)
+
+            if idle and self._on_idle is not None:
+                try:
+                    self._on_idle()
+                except Exception:
+                    # e.g. a failed cache flush: retried when the queue next
+                    # drains, and must not take the thread down with it
+                    pass
+
+            # Shared rate budget across every session
+            time.sleep(self._min_interval)
@@ -0,0 +1,68 @@
+"""Bi-directional map component that filters and clusters players in the browser.
+
+The player dataset is sent once, with its facets dictionary-encoded (a value
+table plus one small integer per player). Facet changes are handled entirely
+in the browser; only marker selections are sent back to the script.
+"""
+import os
+
+import streamlit.components.v1 as components
+
+_component = components.declare_component(
+    "player_map",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "player_map_component"),
+)
+
+
+def _dictionary_encode(values):
+    """Return (codes, dictionary), with -1 for missing values"""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.tolist(), [str(u) for u in uniques]
+
+
+def encode_players(df):
+    """Compact, column-oriented payload for the component"""
+    import pandas as pd
+    from constants import FIFA_TO_COUNTRY
+
+    valid = df.dropna(subset=["lat", "lon"])
+
+    def country_names(column):
+        if column not in valid.columns:
+            return pd.Series(None, index=valid.index, dtype=object)
+        codes = valid[column].astype("string").str.strip()
+        codes = codes.mask(codes.isin(["", "None"]))
+        return codes.str.upper().map(FIFA_TO_COUNTRY).fillna(codes)
+
+    birth_country = country_names("NoB")
+    if "country" in valid.columns:
+        birth_country = birth_country.fillna(valid["country"])
+
+    facets = {}
+    for key, label, values in (
+        ("nat", "Nationality", country_names("Nat")),
+        ("birth", "Birth country", birth_country),
+        ("nat2", "2nd nationality", country_names("2nd Nat")),
+    ):
+        codes, dictionary = _dictionary_encode(values)
+        facets[key] = {"label": label, "values": dictionary, "codes": codes}
+
+    return {
+        # Lets the browser skip rebuilding markers when the same data is rendered again
+        "id": str(pd.util.hash_pandas_object(valid[["PlayerName", "lat", "lon"]], index=False).sum()),
+        "lat": valid["lat"].round(5).tolist(),
+        "lon": valid["lon"].round(5).tolist(),
+        "name": valid["PlayerName"].astype(str).tolist(),
+        "city": valid["BirthCity"].astype(str).tolist(),
+        "facets": facets,
+    }
+
+
+def player_map(data, tiles, height=800, key=None):
+    """Render the filterable map and return the last selection event, if any.
+
+    tiles is a list of {"url", "attribution"} dicts, bottom layer first.
+    """
+    return _component(data=data, tiles=tiles, height=height, key=key, default=None)
@@ -0,0 +1,68 @@
+"""Opt-in per-session profiling of the upload → map pipeline.
+
+Only imported when profiling is switched on (FM_PROFILE=1 or ?profile=1),
+so a normal run never pays for it.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+from contextlib import contextmanager
+
+# Pipeline functions the text report always breaks out
+HOT_FUNCTIONS = (
+    "load_players",
+    "read_players_csv",
+    "parse_file_data",
+    "process_players_data",
+    "plan_geocoding",
+    "submit_geocoding",
+    "geocode_players",
+    "create_map_html",
+)
+
+
+class RunProfile:
+    """cProfile stats accumulated over the stages of a session's run"""
+
+    def __init__(self):
+        self.stats = None
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the enclosed block and merge it into the run's stats"""
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def dump(self) -> bytes:
+        """Serialize in the pstats file format (pstats, snakeviz, gprof2dot...)"""
+        return marshal.dumps(self.stats.stats if self.stats is not None else {})
+
+    def report(self, limit=25) -> str:
+        """Human-readable summary: stage timings, hot functions, top cumulative entries"""
+        out = io.StringIO()
+        out.write("Stage timings (wall clock):\n")
+        for name, seconds in self.stages.items():
+            out.write(f"  {name:<12} {seconds * 1000:9.1f} ms\n")
+        if self.stats is None:
+            return out.getvalue()
+
+        self.stats.stream = out
+        self.stats.sort_stats("cumulative")
+        out.write("\nPipeline functions:\n")
+        self.stats.print_stats("|".join(HOT_FUNCTIONS))
+        out.write("\nTop entries:\n")
+        self.stats.print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,133 @@
+"""StageGate admission and the app's admitted() wrapper around it."""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import StageGate  # noqa: E402
+
+try:
+    import app
+except ImportError:
+    app = None
+
+
+class StageGateTest(unittest.TestCase):
+    def test_first_come_first_served(self):
+        gate = StageGate("parse", 1)
+        first = gate.enqueue()
+        self.assertTrue(gate.wait(first, timeout=0))
+        second, third = gate.enqueue(), gate.enqueue()
+        gate.release(0.1)
+        # The slot is free, but it belongs to the ticket ahead
+        self.assertFalse(gate.wait(third, timeout=0.05))
+        self.assertTrue(gate.wait(second, timeout=0))
+        gate.release(0.1)
+        self.assertTrue(gate.wait(third, timeout=0))
+
+    def test_never_more_than_slots_admitted(self):
+        gate = StageGate("map", 2)
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def stage():
+            ticket = gate.enqueue()
+            gate.wait(ticket)
+            with lock:
+                active.append(ticket)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(ticket)
+            gate.release(0.02)
+
+        threads = [threading.Thread(target=stage) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(peak), 8)
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(gate.load(), (0, 0))
+
+    def test_cancelled_head_lets_the_next_one_in(self):
+        gate = StageGate("geocode", 1)
+        holder = gate.enqueue()
+        gate.wait(holder, timeout=0)
+        head, next_ticket = gate.enqueue(), gate.enqueue()
+        gate.release(0.1)
+        gate.cancel(head)
+        self.assertTrue(gate.wait(next_ticket, timeout=0))
+        self.assertEqual(gate.load(), (1, 0))
+
+    def test_release_frees_a_slot_and_updates_the_average(self):
+        gate = StageGate("parse", 1, initial_estimate=1.0, smoothing=0.5)
+        ticket = gate.enqueue()
+        gate.wait(ticket, timeout=0)
+        self.assertEqual(gate.load(), (1, 0))
+        gate.release(3.0)
+        self.assertEqual(gate.load(), (0, 0))
+        self.assertEqual(gate.average_seconds, 2.0)
+
+    def test_position_and_estimated_wait(self):
+        gate = StageGate("map", 2, initial_estimate=4.0)
+        for _ in range(2):
+            gate.wait(gate.enqueue(), timeout=0)
+        queued = [gate.enqueue() for _ in range(3)]
+        self.assertEqual([gate.position(t) for t in queued], [1, 2, 3])
+        self.assertEqual(gate.position(object()), 0)
+        self.assertEqual(gate.estimated_wait(0), 0.0)
+        self.assertEqual(gate.estimated_wait(1), 4.0)
+        self.assertEqual(gate.estimated_wait(2), 4.0)
+        self.assertEqual(gate.estimated_wait(3), 8.0)
+
+
+@unittest.skipIf(app is None, "needs the app's dependencies (streamlit, pandas)")
+class AdmittedTest(unittest.TestCase):
+    def setUp(self):
+        self.gate = StageGate("map", 1)
+        patcher = mock.patch.object(app, "get_stage_gates", lambda: {"map": self.gate})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slot_released_when_the_stage_raises(self):
+        with self.assertRaises(ValueError):
+            with app.admitted("map"):
+                self.assertEqual(self.gate.load(), (1, 0))
+                raise ValueError("stage failed")
+        self.assertEqual(self.gate.load(), (0, 0))
+
+    def test_slot_released_on_rerun_right_after_admission(self):
+        class Rerun(Exception):
+            pass
+
+        placeholder = mock.Mock()
+        placeholder.empty.side_effect = Rerun
+        with mock.patch.object(app.st, "empty", return_value=placeholder):
+            with self.assertRaises(Rerun):
+                with app.admitted("map"):
+                    self.fail("stage should not run")
+        self.assertEqual(self.gate.load(), (0, 0))
+
+    def test_ticket_cancelled_on_rerun_while_queued(self):
+        class Rerun(Exception):
+            pass
+
+        holder = self.gate.enqueue()
+        self.gate.wait(holder, timeout=0)
+        placeholder = mock.Mock()
+        placeholder.info.side_effect = Rerun
+        with mock.patch.object(app.st, "empty", return_value=placeholder):
+            with self.assertRaises(Rerun):
+                with app.admitted("map"):
+                    self.fail("stage should not run")
+        self.assertEqual(self.gate.load(), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
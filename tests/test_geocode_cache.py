@@ -0,0 +1,172 @@
+"""RedisBackend and NearCache against a local stand-in Redis server."""
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geocode_cache  # noqa: E402
+from geocode_cache import NearCache, RedisBackend  # noqa: E402
+
+
+class StandInRedis:
+    """Just enough of the Redis protocol for the cache: MGET, SET, AUTH, SELECT"""
+
+    def __init__(self, port=0):
+        self.data = {}
+        self.commands = []
+        self._connections = []
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                server._connections.append(self.connection)
+
+            def read_command(self):
+                header = self.rfile.readline()
+                if not header.startswith(b"*"):
+                    return None
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def handle(self):
+                while True:
+                    try:
+                        args = self.read_command()
+                    except (OSError, ValueError):
+                        return
+                    if not args:
+                        return
+                    name = args[0].decode().upper()
+                    server.commands.append(name)
+                    if name == "MGET":
+                        values = [server.data.get(k) for k in args[1:]]
+                        reply = b"*%d\r\n" % len(values) + b"".join(
+                            b"$-1\r\n" if v is None else b"$%d\r\n%s\r\n" % (len(v), v)
+                            for v in values
+                        )
+                    elif name == "SET":
+                        server.data[args[1]] = args[2]
+                        reply = b"+OK\r\n"
+                    elif name in ("AUTH", "SELECT"):
+                        reply = b"+OK\r\n"
+                    else:
+                        reply = b"-ERR unknown command\r\n"
+                    try:
+                        self.wfile.write(reply)
+                    except OSError:
+                        return
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        # Drop client connections too, like a server going away would
+        for conn in self._connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class RedisBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = StandInRedis()
+        self.addCleanup(self.redis.stop)
+
+    def backend(self, **kwargs):
+        return RedisBackend(f"redis://127.0.0.1:{self.redis.port}/0", timeout=1, **kwargs)
+
+    def test_round_trip(self):
+        backend = self.backend()
+        backend.set_many({"london": {"lat": 51.5, "lon": -0.1, "country": "England"}, "nowhere": None})
+        found = backend.get_many(["london", "nowhere", "unknown"])
+        self.assertEqual(found, {"london": {"lat": 51.5, "lon": -0.1, "country": "England"}, "nowhere": None})
+        self.assertIn(b"fm-geocode:london", self.redis.data)
+
+    def test_batches_over_mget_batch(self):
+        backend = self.backend()
+        count = geocode_cache.MGET_BATCH * 2 + 10
+        backend.set_many({f"city {i}": {"lat": i, "lon": 0} for i in range(count)})
+        self.redis.commands.clear()
+        found = backend.get_many([f"city {i}" for i in range(count)] + ["missing"])
+        self.assertEqual(len(found), count)
+        self.assertEqual(found["city 7"], {"lat": 7, "lon": 0})
+        self.assertEqual(self.redis.commands, ["MGET"] * 3)
+
+    def test_foreign_values_are_misses(self):
+        self.redis.data[b"fm-geocode:garbage"] = b"not json"
+        self.redis.data[b"fm-geocode:number"] = b"5"
+        self.redis.data[b"fm-geocode:ok"] = b'{"lat": 1, "lon": 2}'
+        found = self.backend().get_many(["garbage", "number", "ok"])
+        self.assertEqual(found, {"ok": {"lat": 1, "lon": 2}})
+
+    def test_server_down_then_back(self):
+        backend = self.backend(retry_after=0.3)
+        backend.set_many({"paris": {"lat": 48.9, "lon": 2.3}})
+        port = self.redis.port
+        self.redis.stop()
+
+        # Degrades instead of raising, and stops trying until retry_after passes
+        self.assertEqual(backend.get_many(["paris"]), {})
+        self.assertFalse(backend.available)
+        backend.set_many({"rome": {"lat": 41.9, "lon": 12.5}})
+
+        self.redis = StandInRedis(port)
+        self.assertEqual(backend.get_many(["paris"]), {})
+        time.sleep(0.35)
+        backend.set_many({"paris": {"lat": 48.9, "lon": 2.3}})
+        self.assertEqual(backend.get_many(["paris", "rome"]), {"paris": {"lat": 48.9, "lon": 2.3}})
+
+
+class NearCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = StandInRedis()
+        self.addCleanup(self.redis.stop)
+        self.backend = RedisBackend(f"redis://127.0.0.1:{self.redis.port}/0", timeout=1)
+
+    def test_repeated_keys_stay_in_process(self):
+        cache = NearCache(self.backend)
+        cache.set_many({"madrid": {"lat": 40.4, "lon": -3.7}})
+        self.redis.commands.clear()
+        self.assertEqual(cache.get_many(["madrid"]), {"madrid": {"lat": 40.4, "lon": -3.7}})
+        self.assertEqual(self.redis.commands, [])
+
+    def test_least_recently_used_is_evicted(self):
+        cache = NearCache(self.backend, max_entries=2)
+        cache.set_many({"a": None, "b": None})
+        cache.get_many(["a"])
+        cache.set_many({"c": None})
+        self.redis.commands.clear()
+        cache.get_many(["a", "c"])
+        self.assertEqual(self.redis.commands, [])
+        cache.get_many(["b"])
+        self.assertEqual(self.redis.commands, ["MGET"])
+
+    def test_entries_expire_with_ttl(self):
+        cache = NearCache(self.backend, ttl=0.2)
+        cache.set_many({"oslo": {"lat": 59.9, "lon": 10.8}})
+        # The shared cache dropped it meanwhile
+        self.redis.data.clear()
+        self.assertEqual(cache.get_many(["oslo"]), {"oslo": {"lat": 59.9, "lon": 10.8}})
+        time.sleep(0.25)
+        self.assertEqual(cache.get_many(["oslo"]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""GeocodeWorker with a stub resolve in place of LocationIQ."""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geocode_worker import GeocodeJob, GeocodeWorker  # noqa: E402
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class StubResolve:
+    """Records every ladder it is asked for; blocks on "gate" until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.blocked = threading.Event()
+
+    def __call__(self, ladder):
+        self.calls.append(ladder[0])
+        if ladder[0] == "gate":
+            self.blocked.set()
+            self.release.wait(5)
+        if ladder[0] == "bad":
+            raise ValueError("boom")
+        return {"lat": len(self.calls), "lon": 0}, None
+
+
+class GeocodeWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.resolve = StubResolve()
+        self.worker = GeocodeWorker(self.resolve, min_interval=0)
+        self.addCleanup(self.resolve.release.set)
+
+    def block(self):
+        """Keep the worker busy so the next submits queue up behind it"""
+        job = self.worker.submit("blocker", [("gate",)])
+        self.resolve.blocked.wait(5)
+        return job
+
+    def test_same_key_is_resolved_once_for_every_job(self):
+        self.block()
+        first = self.worker.submit("a", [("madrid", "madrid, spain")])
+        second = self.worker.submit("b", [("madrid", "madrid, spain"), ("lyon",)])
+        self.resolve.release.set()
+        wait_until(lambda: first.done and second.done)
+        self.assertEqual(self.resolve.calls.count("madrid"), 1)
+        self.assertEqual(first.results["madrid"], second.results["madrid"])
+        self.assertIn("lyon", second.results)
+
+    def test_key_in_flight_is_not_requested_again(self):
+        gate = self.block()
+        late = self.worker.submit("late", [("gate",)])
+        self.resolve.release.set()
+        wait_until(lambda: gate.done and late.done)
+        self.assertEqual(self.resolve.calls, ["gate"])
+
+    def test_owners_are_served_round_robin(self):
+        self.block()
+        self.worker.submit("big", [("a1",), ("a2",), ("a3",)])
+        small = self.worker.submit("small", [("b1",), ("b2",)])
+        self.resolve.release.set()
+        wait_until(lambda: small.done and len(self.resolve.calls) == 6)
+        self.assertEqual(self.resolve.calls, ["gate", "a1", "b1", "a2", "b2", "a3"])
+
+    def test_resolve_exception_becomes_a_message(self):
+        job = self.worker.submit("a", [("bad",), ("good",)])
+        wait_until(lambda: job.done)
+        self.assertIsNone(job.results["bad"])
+        self.assertIsNotNone(job.results["good"])
+        self.assertEqual(len(job.messages), 1)
+        self.assertIn("'bad'", job.messages[0])
+        self.assertIn("boom", job.messages[0])
+
+    def test_done_and_progress(self):
+        empty = GeocodeJob("a", [])
+        self.assertTrue(empty.done)
+        self.assertEqual(empty.progress, 1.0)
+
+        self.worker.submit("blocker", [("first",)])
+        wait_until(lambda: "first" in self.resolve.calls)
+        job = self.worker.submit("a", [("x",), ("gate",)])
+        wait_until(lambda: "x" in job.results)
+        self.assertFalse(job.done)
+        self.assertEqual(job.progress, 0.5)
+        self.resolve.release.set()
+        wait_until(lambda: job.done)
+        self.assertEqual(job.progress, 1.0)
+
+    def test_failing_on_idle_keeps_the_worker_alive(self):
+        idle_called = threading.Event()
+
+        def on_idle():
+            idle_called.set()
+            raise OSError("disk full")
+
+        worker = GeocodeWorker(self.resolve, min_interval=0, on_idle=on_idle)
+        first = worker.submit("a", [("x",)])
+        self.assertTrue(idle_called.wait(5))
+        thread = worker._thread
+        time.sleep(0.05)
+        self.assertTrue(thread.is_alive())
+        second = worker.submit("a", [("y",)])
+        wait_until(lambda: second.done)
+        self.assertTrue(first.done)
+        self.assertIs(worker._thread, thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Ladder resolution and cache-first planning, with LocationIQ stubbed out.
+
+Imports app, which needs the app's dependencies (streamlit, pandas); the
+script itself runs up to the upload screen, as in bench_import_time.py.
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geocode_cache import CacheBackend  # noqa: E402
+
+try:
+    import pandas as pd
+    import app
+except ImportError:
+    app = None
+
+ROSARIO = {"lat": -32.9, "lon": -60.6, "country": "Argentina"}
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+
+    def get_many(self, keys):
+        return {k: self.data[k] for k in keys if k in self.data}
+
+    def set_many(self, items):
+        self.data.update(items)
+
+
+class StubGeocode:
+    """Answers each query from a {query: (result, message)} table"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def __call__(self, query, api_key):
+        self.calls.append(query)
+        return self.answers.get(query, (None, None))
+
+
+@unittest.skipIf(app is None, "needs the app's dependencies (streamlit, pandas)")
+class ResolveLadderTest(unittest.TestCase):
+    ladder = ("Rosario, Santa Fe Province, Argentina", "Rosario, Argentina", "Rosario, Santa Fe Province")
+
+    def resolve(self, answers):
+        cache = MemoryBackend()
+        stub = StubGeocode(answers)
+        with mock.patch.object(app, "geocode_city", stub), mock.patch.object(app, "GEOCODE_INTERVAL", 0):
+            outcome = app.resolve_ladder(self.ladder, "key", cache)
+        return outcome, cache.data, stub.calls
+
+    def test_rate_limit_leaves_the_ladder_uncached(self):
+        (result, message), cached, calls = self.resolve({
+            self.ladder[0]: (None, "LocationIQ rate-limited (HTTP 429)."),
+        })
+        self.assertIsNone(result)
+        self.assertIn("429", message)
+        self.assertEqual(cached, {})
+        # No point hammering the other candidates while rate-limited
+        self.assertEqual(calls, [self.ladder[0]])
+
+    def test_network_error_after_a_definite_miss(self):
+        (result, message), cached, _ = self.resolve({
+            self.ladder[1]: (None, "Geocoding exception for 'Rosario, Argentina': timed out"),
+        })
+        self.assertIsNone(result)
+        self.assertIsNotNone(message)
+        # The first candidate really had no match; the failed one and the full key stay open
+        self.assertEqual(cached, {self.ladder[0]: None})
+
+    def test_no_result_everywhere_is_cached(self):
+        (result, message), cached, calls = self.resolve({})
+        self.assertEqual((result, message), (None, None))
+        self.assertEqual(cached, dict.fromkeys(self.ladder))
+        self.assertEqual(calls, list(self.ladder))
+
+    def test_full_key_records_the_candidate_that_resolved(self):
+        (result, message), cached, calls = self.resolve({self.ladder[1]: (ROSARIO, None)})
+        self.assertEqual((result, message), (ROSARIO, None))
+        self.assertEqual(cached, {self.ladder[0]: ROSARIO, self.ladder[1]: ROSARIO})
+        self.assertEqual(calls, list(self.ladder[:2]))
+
+
+@unittest.skipIf(app is None, "needs the app's dependencies (streamlit, pandas)")
+class GeocodeCityTest(unittest.TestCase):
+    def lookup(self, status, body=None, error=None):
+        response = mock.Mock(status_code=status)
+        response.json.return_value = body
+        get = mock.Mock(return_value=response, side_effect=error)
+        with mock.patch("requests.get", get):
+            return app.geocode_city("Rosario, Argentina", "key")
+
+    def test_not_found_is_a_definite_miss(self):
+        self.assertEqual(self.lookup(404, {"error": "Unable to geocode"}), (None, None))
+        self.assertEqual(self.lookup(200, []), (None, None))
+
+    def test_failures_carry_a_message(self):
+        self.assertIsNotNone(self.lookup(429)[1])
+        self.assertIsNotNone(self.lookup(403)[1])
+        self.assertIsNotNone(self.lookup(200, error=OSError("timed out"))[1])
+
+
+@unittest.skipIf(app is None, "needs the app's dependencies (streamlit, pandas)")
+class PlanGeocodingTest(unittest.TestCase):
+    def plan(self, rows, cached):
+        df = pd.DataFrame(rows, columns=["BirthCity_base", "BirthCity_paren", "NoB"])
+        backend = MemoryBackend(cached)
+        with mock.patch.object(app, "get_snapshot", lambda: None), \
+                mock.patch.object(app, "get_shared_cache", lambda: backend):
+            return app.plan_geocoding(df)
+
+    def test_fallback_keys_and_missing_order(self):
+        rows = (
+            [("Rosario", "SF", "ARG")] * 2
+            + [("Lyon", None, "FRA")] * 2
+            + [("Madrid", None, "ESP")] * 3
+            + [("Springfield", "SF", "ARG")]
+            + [("Atlantis", None, "ARG")]
+        )
+        resolved, missing = self.plan(rows, {
+            # Only a fallback key is cached for Rosario
+            "Rosario, Argentina": ROSARIO,
+            # Springfield's city+country candidate is known to fail
+            "Springfield, Argentina": None,
+            # Atlantis already failed as a whole
+            "Atlantis, Argentina": None,
+        })
+        self.assertEqual(resolved, {
+            "Rosario, Santa Fe Province, Argentina": ROSARIO,
+            "Atlantis, Argentina": None,
+        })
+        self.assertEqual(missing, [
+            ("Madrid, Spain",),
+            ("Lyon, France",),
+            ("Springfield, Santa Fe Province, Argentina", "Springfield, Santa Fe Province"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""TileProxy against a local stand-in tile server."""
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tile_proxy import TileCache, TileProxy  # noqa: E402
+
+
+class StandInTiles:
+    """Tile server that counts requests and can answer 304, fail or be slow"""
+
+    def __init__(self):
+        self.hits = 0
+        self.not_modified = 0
+        self.fail = False
+        self.delay = 0.0
+        self.etag = '"v1"'
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.hits += 1
+                time.sleep(server.delay)
+                if server.fail:
+                    self.send_error(500)
+                    return
+                if self.headers.get("If-None-Match") == server.etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = self.path.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("ETag", server.etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TileProxyTest(unittest.TestCase):
+    def setUp(self):
+        self.upstream = StandInTiles()
+        self.addCleanup(self.upstream.stop)
+        self.cache_dir = tempfile.mkdtemp()
+
+    def proxy(self, **kwargs):
+        return TileProxy(self.cache_dir, upstreams={"osm": self.upstream.url}, **kwargs)
+
+    def test_cache_hit(self):
+        proxy = self.proxy()
+        first = proxy.fetch("osm", 3, 1, 2)
+        second = proxy.fetch("osm", 3, 1, 2)
+        self.assertEqual(first, (200, b"/3/1/2.png", "image/png"))
+        self.assertEqual(second, first)
+        self.assertEqual(self.upstream.hits, 1)
+
+    def test_unknown_layer(self):
+        self.assertEqual(self.proxy().fetch("nope", 0, 0, 0)[0], 404)
+        self.assertEqual(self.upstream.hits, 0)
+
+    def test_stale_tile_is_revalidated(self):
+        proxy = self.proxy(max_age=0)
+        proxy.fetch("osm", 1, 0, 1)
+        status, body, _ = proxy.fetch("osm", 1, 0, 1)
+        self.assertEqual((status, body), (200, b"/1/0/1.png"))
+        self.assertEqual(self.upstream.hits, 2)
+        self.assertEqual(self.upstream.not_modified, 1)
+
+    def test_stale_tile_served_when_upstream_fails(self):
+        proxy = self.proxy(max_age=0)
+        proxy.fetch("osm", 2, 1, 1)
+        self.upstream.fail = True
+        self.assertEqual(proxy.fetch("osm", 2, 1, 1)[:2], (200, b"/2/1/1.png"))
+        self.assertEqual(proxy.fetch("osm", 2, 0, 0)[0], 500)
+
+    def test_stale_tile_served_when_upstream_is_down(self):
+        proxy = self.proxy(max_age=0, timeout=1)
+        proxy.fetch("osm", 2, 1, 1)
+        self.upstream.stop()
+        self.assertEqual(proxy.fetch("osm", 2, 1, 1)[:2], (200, b"/2/1/1.png"))
+        self.assertEqual(proxy.fetch("osm", 2, 0, 0)[0], 502)
+
+    def test_lru_eviction(self):
+        cache = TileCache(self.cache_dir, max_bytes=25)
+        meta = {"fetched": time.time()}
+        cache.put("osm", 0, 0, 0, b"a" * 10, meta)
+        cache.put("osm", 1, 0, 0, b"b" * 10, meta)
+        # Reading the first tile makes the second the least recently used
+        cache.get("osm", 0, 0, 0)
+        cache.put("osm", 1, 1, 0, b"c" * 10, meta)
+        self.assertIsNotNone(cache.get("osm", 0, 0, 0)[0])
+        self.assertIsNone(cache.get("osm", 1, 0, 0)[0])
+        self.assertIsNotNone(cache.get("osm", 1, 1, 0)[0])
+
+    def test_concurrent_writes_of_one_tile(self):
+        cache = TileCache(self.cache_dir)
+        errors = []
+
+        def put():
+            try:
+                cache.put("osm", 3, 1, 1, b"tile", {"fetched": time.time()})
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=put) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.get("osm", 3, 1, 1)[0], b"tile")
+        leftovers = [n for _, _, files in os.walk(self.cache_dir) for n in files if n.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+    def test_concurrent_misses_share_one_fetch(self):
+        self.upstream.delay = 0.3
+        proxy = self.proxy().start(host="127.0.0.1", port=0, prefetch=False)
+        self.addCleanup(proxy.stop)
+        url = proxy.url_template("osm").format(z=3, x=1, y=1)
+        results = []
+
+        def get():
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                results.append((resp.status, resp.read()))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [(200, b"/3/1/1.png")] * 8)
+        self.assertEqual(self.upstream.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
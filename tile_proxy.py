@@ -0,0 +1,293 @@
+"""Optional caching proxy for the map tile layers.
+
+Browsers fetch tiles from this proxy instead of OpenStreetMap/ArcGIS
+directly. Tiles are kept in an on-disk LRU cache, revalidated upstream with
+ETag/Last-Modified once they go stale, and the low zoom levels every map
+opens on are prefetched at startup.
+
+Upstream URLs are plain templates, so a local stand-in tile server can be
+passed as `upstreams` for testing:
+
+    proxy = TileProxy(cache_dir, upstreams={"osm": "http://127.0.0.1:9000/{z}/{x}/{y}.png"})
+    proxy.start(port=0)
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TILE_LAYERS = {
+    "osm": "https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+    "esri-imagery": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+    "esri-labels": "https://server.arcgisonline.com/ArcGIS/rest/services/Reference/World_Boundaries_and_Places/MapServer/tile/{z}/{y}/{x}",
+}
+
+USER_AGENT = "fm-birthplace-map tile proxy"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Tiles older than this are revalidated upstream before being served
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+PREFETCH_MAX_ZOOM = 2
+
+_TILE_PATH = re.compile(r"^/tiles/([\w-]+)/(\d+)/(\d+)/(\d+)$")
+
+
+class TileCache:
+    """On-disk tile store with least-recently-used eviction by total size"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # relative path -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self._total = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # Rebuild the LRU order from what's on disk, oldest access first
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    # Left behind by a write that was interrupted
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                if name.endswith(".meta"):
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, os.path.relpath(path, self.cache_dir), stat.st_size))
+        for _, rel, size in sorted(found):
+            self._entries[rel] = size
+            self._total += size
+
+    def _path(self, layer, z, x, y):
+        return os.path.join(layer, str(z), str(x), str(y))
+
+    @staticmethod
+    def _write(path, data):
+        # Unique temp file per writer, so concurrent writes of one tile can't collide
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get(self, layer, z, x, y):
+        """Return (body, meta) for a cached tile, or (None, None)"""
+        rel = self._path(layer, z, x, y)
+        path = os.path.join(self.cache_dir, rel)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            with open(path + ".meta", "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        with self._lock:
+            if rel in self._entries:
+                self._entries.move_to_end(rel)
+        # mtime doubles as last access so the LRU order survives restarts
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return body, meta
+
+    def touch(self, layer, z, x, y, meta):
+        """Record a successful revalidation without rewriting the tile"""
+        path = os.path.join(self.cache_dir, self._path(layer, z, x, y))
+        try:
+            self._write(path + ".meta", json.dumps(meta).encode("utf-8"))
+        except OSError:
+            pass
+
+    def put(self, layer, z, x, y, body, meta):
+        """Store a tile; a failed write just leaves it uncached"""
+        rel = self._path(layer, z, x, y)
+        path = os.path.join(self.cache_dir, rel)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write(path, body)
+            self._write(path + ".meta", json.dumps(meta).encode("utf-8"))
+        except OSError:
+            return
+
+        with self._lock:
+            self._total -= self._entries.pop(rel, 0)
+            self._entries[rel] = len(body)
+            self._total += len(body)
+            evict = []
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old, size = self._entries.popitem(last=False)
+                self._total -= size
+                evict.append(old)
+        for old in evict:
+            for suffix in ("", ".meta"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, old + suffix))
+                except OSError:
+                    pass
+
+
+class _InFlight:
+    """An upstream fetch other requests for the same tile can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = (502, b"", "text/plain")
+
+
+class TileProxy:
+    """Serves /tiles/<layer>/<z>/<x>/<y> from the cache, falling back to upstream"""
+
+    def __init__(self, cache_dir, upstreams=None, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, timeout=10):
+        self.upstreams = dict(upstreams or TILE_LAYERS)
+        self.cache = TileCache(cache_dir, max_bytes)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.server = None
+        self.public_url = None
+        # (layer, z, x, y) -> _InFlight for upstream fetches in progress
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def fetch(self, layer, z, x, y):
+        """Return (status, body, content type) for a tile, using the cache when fresh"""
+        if layer not in self.upstreams:
+            return 404, b"", "text/plain"
+
+        body, meta = self.cache.get(layer, z, x, y)
+        if body is not None and time.time() - meta.get("fetched", 0) < self.max_age:
+            return 200, body, meta.get("content_type", "image/png")
+
+        # Concurrent misses for one tile share a single upstream request
+        key = (layer, z, x, y)
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+        if not leader:
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = self._fetch_upstream(layer, z, x, y, body, meta)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.done.set()
+        return call.result
+
+    def _fetch_upstream(self, layer, z, x, y, body, meta):
+        template = self.upstreams[layer]
+        request = urllib.request.Request(
+            template.format(z=z, x=x, y=y), headers={"User-Agent": USER_AGENT}
+        )
+        # Conditional revalidation of a stale tile
+        if meta is not None:
+            if meta.get("etag"):
+                request.add_header("If-None-Match", meta["etag"])
+            if meta.get("last_modified"):
+                request.add_header("If-Modified-Since", meta["last_modified"])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                fresh = resp.read()
+                new_meta = {
+                    "fetched": time.time(),
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "content_type": resp.headers.get("Content-Type", "image/png"),
+                }
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and body is not None:
+                meta["fetched"] = time.time()
+                self.cache.touch(layer, z, x, y, meta)
+                return 200, body, meta.get("content_type", "image/png")
+            if body is not None:
+                # Serve stale rather than nothing when upstream is unhappy
+                return 200, body, meta.get("content_type", "image/png")
+            return e.code, b"", "text/plain"
+        except (OSError, ValueError):
+            if body is not None:
+                return 200, body, meta.get("content_type", "image/png")
+            return 502, b"", "text/plain"
+
+        self.cache.put(layer, z, x, y, fresh, new_meta)
+        return 200, fresh, new_meta["content_type"]
+
+    def prefetch(self, max_zoom=PREFETCH_MAX_ZOOM, layers=None):
+        """Warm the cache with every tile up to max_zoom"""
+        for layer in layers or self.upstreams:
+            for z in range(max_zoom + 1):
+                for x in range(2 ** z):
+                    for y in range(2 ** z):
+                        try:
+                            self.fetch(layer, z, x, y)
+                        except OSError:
+                            # Warming is best effort, the tile is fetched on demand later
+                            continue
+
+    def start(self, host="0.0.0.0", port=8502, public_url=None, prefetch=True):
+        """Serve in a background thread; port=0 picks a free port"""
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                m = _TILE_PATH.match(self.path.split("?", 1)[0])
+                if not m:
+                    self.send_error(404)
+                    return
+                layer, z, x, y = m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4))
+                status, body, content_type = proxy.fetch(layer, z, x, y)
+                if status != 200:
+                    self.send_error(status)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "public, max-age=86400")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        bound_port = self.server.server_address[1]
+        self.public_url = (public_url or f"http://localhost:{bound_port}").rstrip("/")
+        threading.Thread(target=self.server.serve_forever, name="tile-proxy", daemon=True).start()
+        if prefetch:
+            threading.Thread(target=self.prefetch, name="tile-prefetch", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def url_template(self, layer):
+        """Leaflet tile URL template pointing at this proxy"""
+        return f"{self.public_url}/tiles/{layer}/{{z}}/{{x}}/{{y}}"
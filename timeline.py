@@ -0,0 +1,192 @@
+"""Season comparison: several exports animated on one map.
+
+Locations are stored once in a shared table and every season is a delta
+(player indices added/removed) against the previous one. The browser
+applies deltas as the slider moves instead of rebuilding the map.
+"""
+import json
+
+
+def player_ids(df):
+    """Stable player identity across exports: FM's UID when exported, else name + birthplace.
+
+    Decided per row, since seasons from different exports may only partly
+    have a UID column, and UIDs are normalized to integer strings because
+    gaps in an HTML export turn the column into floats.
+    """
+    import pandas as pd
+
+    names = df["PlayerName"].astype(str) + "|" + df["BirthCity"].astype(str)
+    ids = "name:" + names
+    if "UID" in df.columns:
+        uids = pd.to_numeric(df["UID"], errors="coerce")
+        # A row without a UID borrows the one its name + birthplace has in another export
+        uids = uids.fillna(names.map(uids.groupby(names).first()))
+        ids = ids.mask(uids.notna(), "uid:" + uids.fillna(0).astype("int64").astype(str))
+    return ids
+
+
+def latest_seasons(df):
+    """One row per player, from the last season they appear in (seasons are concatenated in order)"""
+    return df[~player_ids(df).duplicated(keep="last")]
+
+
+def encode_timeline(df):
+    """Build {locations, players, frames} from players tagged with a Season column"""
+    import pandas as pd
+
+    valid = df.dropna(subset=["lat", "lon"]).copy()
+    valid["_id"] = player_ids(valid)
+
+    # Shared location table, each player points at an entry
+    coords = valid[["lat", "lon"]].round(5)
+    valid["_loc"] = coords.groupby(["lat", "lon"], sort=False).ngroup()
+    locations = coords.drop_duplicates().to_numpy().tolist()
+
+    players = valid.drop_duplicates("_id")
+    player_index = pd.Series(range(len(players)), index=players["_id"].to_numpy())
+    valid["_player"] = valid["_id"].map(player_index)
+
+    frames = []
+    previous = set()
+    for season in df["Season"].unique():
+        current = set(valid.loc[valid["Season"] == season, "_player"].tolist())
+        frames.append({
+            "label": str(season),
+            "added": sorted(current - previous),
+            "removed": sorted(previous - current),
+            "total": len(current),
+        })
+        previous = current
+
+    return {
+        "locations": locations,
+        "players": {
+            "name": players["PlayerName"].astype(str).tolist(),
+            "city": players["BirthCity"].astype(str).tolist(),
+            "loc": players["_loc"].tolist(),
+        },
+        "frames": frames,
+    }
+
+
+def render_timeline_html(timeline, tiles, height=800):
+    """Standalone Leaflet page with a season slider that applies deltas client-side"""
+    payload = json.dumps(timeline, separators=(",", ":")).replace("</", "<\\/")
+    tile_specs = json.dumps(tiles).replace("</", "<\\/")
+    return TIMELINE_TEMPLATE.replace("__TIMELINE__", payload).replace(
+        "__TILES__", tile_specs
+    ).replace("__MAP_HEIGHT__", str(height - 60))
+
+
+TIMELINE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+  <link rel="stylesheet" href="https://unpkg.com/leaflet.markercluster@1.5.3/dist/MarkerCluster.css">
+  <link rel="stylesheet" href="https://unpkg.com/leaflet.markercluster@1.5.3/dist/MarkerCluster.Default.css">
+  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+  <script src="https://unpkg.com/leaflet.markercluster@1.5.3/dist/leaflet.markercluster.js"></script>
+  <style>
+    body { margin: 0; font-family: Arial, sans-serif; color: #374151; }
+    #controls { display: flex; gap: 12px; align-items: center; padding: 8px 0; font-size: 13px; }
+    #slider { flex: 1; accent-color: #667eea; }
+    #play {
+      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+      color: white; border: none; border-radius: 8px; padding: 6px 14px; cursor: pointer;
+    }
+    #season { font-weight: 600; color: #2563EB; min-width: 120px; }
+    #delta { min-width: 160px; text-align: right; }
+    #map { height: __MAP_HEIGHT__px; border-radius: 8px; }
+    .custom-cluster div {
+      background-color: #38a7da; color: white; width: 30px; height: 30px; line-height: 30px;
+      border-radius: 15px; text-align: center; font-weight: bold; font-size: 14px;
+    }
+  </style>
+</head>
+<body>
+  <div id="controls">
+    <button id="play">▶ Play</button>
+    <input id="slider" type="range" min="0" step="1" value="0">
+    <span id="season"></span>
+    <span id="delta"></span>
+  </div>
+  <div id="map"></div>
+  <script>
+    var timeline = __TIMELINE__;
+    var tiles = __TILES__;
+
+    function escapeHtml(s) {
+      return String(s).replace(/[&<>"']/g, function (c) {
+        return { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" }[c];
+      });
+    }
+
+    var map = L.map("map", { maxBounds: [[-90, -180], [90, 180]] }).setView([20, 0], 2);
+    tiles.forEach(function (t) {
+      L.tileLayer(t.url, { attribution: t.attribution, noWrap: true }).addTo(map);
+    });
+    var cluster = L.markerClusterGroup({
+      maxClusterRadius: 1,
+      spiderfyOnMaxZoom: true,
+      iconCreateFunction: function (c) {
+        return L.divIcon({ html: "<div>" + c.getChildCount() + "</div>", className: "custom-cluster", iconSize: [30, 30] });
+      }
+    }).addTo(map);
+
+    // Markers are created the first time a player appears and reused afterwards
+    var markers = {};
+    function marker(i) {
+      if (!markers[i]) {
+        var loc = timeline.locations[timeline.players.loc[i]];
+        markers[i] = L.marker(loc).bindTooltip(
+          "<strong>" + escapeHtml(timeline.players.name[i]) + "</strong><br>📍 " + escapeHtml(timeline.players.city[i])
+        );
+      }
+      return markers[i];
+    }
+
+    var frames = timeline.frames;
+    var current = -1;
+
+    function step(frame, forward) {
+      var add = forward ? frame.added : frame.removed;
+      var remove = forward ? frame.removed : frame.added;
+      cluster.removeLayers(remove.map(marker));
+      cluster.addLayers(add.map(marker));
+    }
+
+    function goTo(target) {
+      while (current < target) { current++; step(frames[current], true); }
+      while (current > target) { step(frames[current], false); current--; }
+      var frame = frames[current];
+      document.getElementById("season").textContent = frame.label + " (" + frame.total + " players)";
+      document.getElementById("delta").textContent = current === 0
+        ? "" : "+" + frame.added.length + " / −" + frame.removed.length + " vs " + frames[current - 1].label;
+    }
+
+    var slider = document.getElementById("slider");
+    slider.max = String(frames.length - 1);
+    slider.addEventListener("input", function () { goTo(Number(slider.value)); });
+
+    var timer = null;
+    document.getElementById("play").addEventListener("click", function () {
+      var button = this;
+      if (timer) { clearInterval(timer); timer = null; button.textContent = "▶ Play"; return; }
+      button.textContent = "⏸ Pause";
+      if (current === frames.length - 1) { slider.value = "0"; goTo(0); }
+      timer = setInterval(function () {
+        if (current >= frames.length - 1) { clearInterval(timer); timer = null; button.textContent = "▶ Play"; return; }
+        slider.value = String(current + 1);
+        goTo(current + 1);
+      }, 1500);
+    });
+
+    goTo(0);
+    var all = timeline.locations;
+    if (all.length > 1) { map.fitBounds(all, { padding: [20, 20] }); }
+  </script>
+</body>
+</html>
+"""